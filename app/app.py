@@ -1,6 +1,20 @@
-from flask import Flask, render_template, url_for
+import os
+import sys
+import threading
+import cv2
+import numpy as np
+from flask import Flask, Response, jsonify, render_template, request, url_for
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from misc import cpu, engine, metrics
+from misc.deskew import deskew
 app = Flask(__name__)
 
+# Requests run on the server's threads: size OpenCV and Tesseract for the
+# requests extracted at once (misc/cpu.py), and make the rest wait.
+layout = cpu.plan(threaded=True)
+layout.apply()
+slots = threading.BoundedSemaphore(layout.workers)
+
 posts = [
     {
         'author': 'Jane Doe',
@@ -19,6 +33,30 @@ def home():
 def about():
     return render_template('about.html', title='About')
 
+@app.route("/extract", methods=['POST'])
+def extract():
+    """Fields of the image uploaded as 'image'; 'type' and 'preprocess'
+    form fields are passed on to engine.extract. A 'deskew' step in
+    preprocess (e.g. "deskew" or "deskew,adaptive") levels the image
+    first."""
+    steps = [step.strip() for step in (request.form.get('preprocess') or '').split(',') if step.strip()]
+    with metrics.timed('decode'):
+        image = cv2.imdecode(np.frombuffer(request.files['image'].read(), np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        metrics.count('errors')
+        return jsonify({'Error': 'could not read image'}), 400
+    if 'deskew' in steps:
+        image, _ = deskew(image)
+        steps.remove('deskew')
+    with slots, metrics.timed('extract'):
+        record = engine.extract(image, doc_type=request.form.get('type') or None,
+                                mode=steps[0] if steps else 'thresh')
+    return jsonify(record.to_dict())
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
 
 if __name__ == '__main__':
     app.run(debug=True)
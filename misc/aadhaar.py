@@ -0,0 +1,140 @@
+'''
+Aadhaar number decoding with the Verhoeff checksum.
+
+The 12th digit of an Aadhaar number is a Verhoeff check digit, which
+catches every single-digit error and every swap of adjacent digits. So a
+misread number doesn't need another OCR pass: decode() maps letter
+look-alikes to digits (O->0, I->1, B->8, S->5, ...), and if the checksum
+still fails it tries single-digit repairs from the usual confusions (8/3,
+1/7, 5/6, ...) at the positions OCR was unsure of. With one check digit, a
+repair anywhere else would just invent some valid number.
+
+    number, confidence = aadhaar.decode(text)
+
+confidence is 'valid' (read as printed), 'corrected' (look-alikes mapped,
+or the one repair at an unsure position that validates), 'ambiguous'
+(several such repairs validate; returned as read), 'invalid' (fails the
+checksum with no such repair; returned as read) or None when there is no
+number at all. Only 'valid' and 'corrected' numbers identify a person.
+'''
+
+import re
+
+# Verhoeff tables: multiplication in the dihedral group D5, the position
+# permutation, and the inverse.
+_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+# Non-digits Tesseract returns for digits in this font.
+LOOKALIKES = {'O': '0', 'o': '0', 'D': '0', 'Q': '0', 'U': '0',
+              'I': '1', 'i': '1', 'l': '1', 'L': '1', '|': '1', '!': '1',
+              'Z': '2', 'z': '2', 'S': '5', 's': '5', 'G': '6', 'b': '6',
+              'T': '7', 'B': '8', 'g': '9', 'q': '9'}
+# Digit misreads, most likely first.
+DIGIT_CONFUSIONS = {'0': '869', '1': '74', '2': '7', '3': '85', '4': '1', '5': '639',
+                    '6': '508', '7': '12', '8': '3069', '9': '08'}
+
+_CHAR = '[0-9%s]' % re.escape(''.join(LOOKALIKES))
+_CANDIDATE = re.compile(r'(?<![0-9A-Za-z])(%s{4})[ .-]?(%s{4})[ .-]?(%s{4})(?![0-9A-Za-z])' % ((_CHAR,) * 3))
+
+
+def verhoeff_valid(digits):
+    c = 0
+    for i, d in enumerate(reversed(digits)):
+        c = _D[c][_P[i % 8][ord(d) - 48]]
+    return c == 0
+
+
+def _plausible(digits):
+    # UIDAI never issues numbers starting with 0 or 1.
+    return digits[0] not in '01' and verhoeff_valid(digits)
+
+
+def _repairs(digits, suspects):
+    """Single-character repairs of digits that pass the checksum, most
+    likely first. suspects maps a position to the characters to try there."""
+    found = []
+    for i, options in sorted(suspects.items()):
+        for rank, alt in enumerate(options):
+            fixed = digits[:i] + alt + digits[i + 1:]
+            if alt != digits[i] and _plausible(fixed) and fixed not in [f for _, _, f in found]:
+                found.append((rank, i, fixed))
+    found.sort()
+    return [fixed for _, _, fixed in found]
+
+
+def decode_candidate(raw, alternatives=None):
+    """(12 digits, confidence) for one 12-character candidate.
+    alternatives[i], when given, lists other characters OCR considered for
+    position i (e.g. Tesseract's choice output).
+
+    Only the positions OCR was unsure of (a look-alike letter, or listed
+    alternatives) are repaired, and the result is 'corrected' only when
+    exactly one repair there validates. A blind repair of any digit finds
+    a checksum-valid number for most misreads and most random strings
+    alike, so it is never made: several repairs give the digits as read,
+    'ambiguous', and none gives them as read, 'invalid'."""
+    digits = ''.join(LOOKALIKES.get(c, c) for c in raw)
+    if _plausible(digits):
+        return digits, 'valid' if digits == raw else 'corrected'
+    unsure = {}
+    for i, c in enumerate(raw):
+        options = ''
+        if alternatives and i < len(alternatives) and alternatives[i]:
+            options = ''.join(LOOKALIKES.get(a, a) for a in alternatives[i])
+        if c in LOOKALIKES:
+            options += DIGIT_CONFUSIONS[digits[i]]
+        options = ''.join(o for o in options if o.isdigit())
+        if options:
+            unsure[i] = options
+    fixes = _repairs(digits, unsure)
+    if len(fixes) == 1:
+        return fixes[0], 'corrected'
+    return digits, 'ambiguous' if fixes else 'invalid'
+
+
+def format_number(digits):
+    return '%s %s %s' % (digits[:4], digits[4:8], digits[8:])
+
+
+def candidates(text):
+    """12-character, 4-4-4 grouped runs in text that are mostly digits."""
+    for m in _CANDIDATE.finditer(text):
+        raw = ''.join(m.groups())
+        if sum(c.isdigit() for c in raw) >= 8:
+            yield raw
+
+
+def decode(text, alternatives=None):
+    """Best Aadhaar number in OCR text, formatted 'XXXX XXXX XXXX', with its
+    confidence flag. A candidate read as printed wins over a corrected one,
+    a corrected one over an ambiguous one, and that over an invalid one."""
+    rank = {'valid': 0, 'corrected': 1, 'ambiguous': 2, 'invalid': 3}
+    best = (None, None)
+    for raw in candidates(text):
+        digits, confidence = decode_candidate(raw, alternatives)
+        if best[1] is None or rank[confidence] < rank[best[1]]:
+            best = (format_number(digits), confidence)
+            if confidence == 'valid':
+                break
+    return best
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+'''Run the extraction pipeline over many card images.
+Usage:
+    python -m misc.batch [-p thresh] [-j JOBS] [-o out.jsonl|out.db|dir/] [--fsync] [--gate] [--orient] [--warp]
+                         [--metrics m.json] [--profile DIR] images/ a.jpg ...
+Directories are scanned for image files and PDFs. Writes one record per image
+to the chosen sink (JSON lines on stdout by default) and, at the end, a JSON
+summary of per-stage timings and counters to stderr or to --metrics.
+Multi-page TIFFs and PDFs are read one page at a time (misc/pages.py) and
+give one record per page, with "Page" set. Shards packed by misc/shards.py
+are claimed one per worker task and give one record per member image. --profile DIR profiles every image in
+every worker and writes the merged report and collapsed stacks to DIR.
+--gate writes {"Rejected": reason, "Quality": scores} for images that fail
+the misc/quality.py checks instead of running OCR on them. --orient turns
+sideways and upside-down images the right way up first (misc/orientation.py),
+after the decoder has applied any EXIF orientation.
+--warp perspective-corrects each card onto a flat 1011x638 raster
+(misc/rectify.py) before OCR. Workers and the OpenCV and Tesseract
+threads inside them share one CPU budget (misc/cpu.py); the layout is in
+the summary's cpu_* gauges.
+'''
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from misc import cpu, engine, metrics, pages, shards
+from misc.common import expand_paths, image_extensions
+from misc.profiling import PROFILER
+from misc.quality import QualityError
+from misc.sinks import open_sink
+
+
+def extract_image(image, mode='thresh', gate=False, orient=False, warp=False):
+    try:
+        return engine.extract(image, mode=mode, gate=gate, orient=orient, warp=warp).to_dict()
+    except QualityError as e:
+        return e.to_dict()
+    except Exception as e:
+        metrics.count('errors')
+        return {'Error': '%s: %s' % (type(e).__name__, e)}
+
+
+def extract_shard(path, mode='thresh', gate=False, orient=False, warp=False):
+    """Records for every image in a shard, or none if another worker has
+    already claimed it. A member that does not decode gets an error record;
+    a shard that cannot be read at all gets one and its claim is released,
+    so a rerun tries it again."""
+    if not shards.claim(path):
+        metrics.count('shards_skipped')
+        return []
+    records = []
+    try:
+        with shards.ShardReader(path) as reader:
+            for name, image in reader:
+                if image is None:
+                    metrics.count('errors')
+                    record = {'Error': 'could not decode image'}
+                else:
+                    record = extract_image(image, mode, gate, orient, warp)
+                record['File'] = name
+                record['Shard'] = path
+                records.append(record)
+    except Exception as e:
+        metrics.count('errors')
+        shards.release(path)
+        records.append({'Error': '%s: %s' % (type(e).__name__, e), 'Shard': path})
+    return records
+
+
+def extract_path(path, mode='thresh', gate=False, orient=False, warp=False):
+    """Records for every page of path (one for a plain image), decoded one
+    page at a time."""
+    if path.endswith('.shard'):
+        return extract_shard(path, mode, gate, orient, warp)
+    multipage = os.path.splitext(path)[1].lower() in pages.MULTIPAGE_EXTENSIONS
+    records = []
+    try:
+        for index, image in pages.iter_pages(path):
+            record = extract_image(image, mode, gate, orient, warp)
+            record['File'] = path
+            if multipage:
+                record['Page'] = index
+            records.append(record)
+    except Exception as e:
+        metrics.count('errors')
+        records.append({'Error': '%s: %s' % (type(e).__name__, e), 'File': path})
+    return records
+
+
+def process_path(path, mode='thresh', profile=False, gate=False, orient=False, warp=False):
+    """Extract one file. Returns (records, metrics state, profile state) so
+    worker processes can ship their timings back to the parent."""
+    if not profile:
+        return extract_path(path, mode, gate, orient, warp), metrics.REGISTRY.drain(), None
+    with PROFILER.profile():
+        records = extract_path(path, mode, gate, orient, warp)
+    return records, metrics.REGISTRY.drain(), PROFILER.state()
+
+
+def run(paths, sink, mode='thresh', jobs=None, profile=False, gate=False, orient=False, warp=False):
+    n = len(paths)
+    layout = cpu.plan(jobs, n)
+    layout.apply()
+    with ProcessPoolExecutor(max_workers=layout.workers, initializer=cpu.init_worker,
+                             initargs=layout.thread_args()) as pool:
+        for records, state, prof in pool.map(process_path, paths, [mode] * n, [profile] * n,
+                                             [gate] * n, [orient] * n, [warp] * n):
+            metrics.REGISTRY.merge(state)
+            if prof is not None:
+                PROFILER.add(prof)
+            for record in records:
+                sink.write(record)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('paths', nargs='+', help='images, PDFs, shards, globs or directories of them')
+    ap.add_argument('-p', '--preprocess', type=str, default='thresh', choices=engine.PREPROCESS_MODES,
+                    help='type of preprocessing applied to every image')
+    ap.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: one per usable core, see misc/cpu.py)')
+    ap.add_argument('-o', '--output', default='-', help='where to write records: - (stdout), *.jsonl, *.db or a directory/')
+    ap.add_argument('--fsync', action='store_true', help='fsync every batch of records before continuing')
+    ap.add_argument('--gate', action='store_true', help='reject blurry, glared, flat or low-resolution images before OCR')
+    ap.add_argument('--orient', action='store_true', help='turn sideways or upside-down images the right way up first')
+    ap.add_argument('--warp', action='store_true', help='perspective-correct each card to a flat 1011x638 raster')
+    ap.add_argument('--metrics', help='write the timing summary here instead of stderr')
+    ap.add_argument('--profile', metavar='DIR', help='profile the run and write reports to DIR')
+    args = ap.parse_args()
+
+    paths = list(expand_paths(args.paths, image_extensions + ['.pdf', '.shard']))
+    with open_sink(args.output, fsync=args.fsync, indent=None) as sink:
+        with metrics.timed('batch'):
+            run(paths, sink, mode=args.preprocess, jobs=args.jobs, profile=bool(args.profile), gate=args.gate,
+                orient=args.orient, warp=args.warp)
+
+    if args.profile:
+        PROFILER.write(args.profile)
+
+    summary = json.dumps(metrics.REGISTRY.summary(), indent=4)
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(summary + '\n')
+    else:
+        sys.stderr.write(summary + '\n')
+
+
+if __name__ == '__main__':
+    main()
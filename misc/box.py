@@ -1,5 +1,8 @@
+import re
 import sys
 
+import numpy as np
+
 class BoxLine(object):
     def __init__(self, letter, left, top, right, bottom, page):
         self.letter = letter
@@ -35,4 +38,90 @@ def load_box_file(path):
     out = []
     for line in open(path):
         out.append(BoxLine.parse_line(line))
-    return out
\ No newline at end of file
+    return out
+
+# Structured dtypes for box data. One row per box keeps a page worth of
+# boxes in a single contiguous array instead of thousands of BoxLines.
+CHAR_DTYPE = np.dtype([
+    ('left', np.int32),
+    ('bottom', np.int32),
+    ('right', np.int32),
+    ('top', np.int32),
+    ('page', np.int16),
+])
+
+WORD_DTYPE = np.dtype([
+    ('page', np.int16),
+    ('block', np.int16),
+    ('par', np.int16),
+    ('line', np.int16),
+    ('word', np.int16),
+    ('left', np.int32),
+    ('top', np.int32),
+    ('width', np.int32),
+    ('height', np.int32),
+    ('conf', np.float32),
+])
+
+
+_BOX_LINE = re.compile(r'^(.*?) (-?\d+ -?\d+ -?\d+ -?\d+ -?\d+)$', re.MULTILINE)
+
+
+def parse_box_text(text):
+    """Parse Tesseract box output ("letter left bottom right top page").
+    Returns (letters, boxes) where letters is a unicode array and boxes is
+    a CHAR_DTYPE array of the same length.
+    """
+    # The regex splits off the letter (which may itself be a space) and the
+    # numeric columns are parsed in one numpy call rather than per line.
+    matches = _BOX_LINE.findall(text)
+    letters = np.array([m[0] for m in matches], dtype=np.str_)
+    cols = np.fromstring(' '.join(m[1] for m in matches), dtype=np.int32, sep=' ')
+    boxes = np.zeros(len(matches), dtype=CHAR_DTYPE)
+    cols = cols.reshape(-1, len(CHAR_DTYPE.names))
+    for i, name in enumerate(CHAR_DTYPE.names):
+        boxes[name] = cols[:, i]
+    return letters, boxes
+
+
+def load_box_array(path):
+    """Load the box data in the file at path.
+    Output is (letters, boxes) as returned by parse_box_text.
+    """
+    with open(path, encoding='utf-8') as f:
+        return parse_box_text(f.read())
+
+
+def parse_tsv(tsv):
+    """Parse Tesseract TSV output (image_to_data) into word boxes.
+    Returns (words, boxes) where words is a unicode array and boxes is a
+    WORD_DTYPE array, both restricted to word-level rows.
+    """
+    rows = [line.split('\t') for line in tsv.splitlines()[1:]]
+    rows = [r for r in rows if len(r) == 12 and r[0] == '5' and r[11].strip()]
+    words = np.array([r[11] for r in rows], dtype=np.str_)
+    boxes = np.zeros(len(rows), dtype=WORD_DTYPE)
+    if len(rows):
+        cols = np.array([r[1:11] for r in rows], dtype=np.float64)
+        for i, name in enumerate(WORD_DTYPE.names):
+            boxes[name] = cols[:, i]
+    return words, boxes
+
+
+def words_to_text(words, boxes):
+    """Rebuild the image_to_string layout from word boxes: words joined by
+    spaces, one line per Tesseract line, blank line between paragraphs."""
+    out = []
+    prev = None
+    for word, (page, block, par, line) in zip(
+            words, boxes[['page', 'block', 'par', 'line']].tolist()):
+        if prev is None:
+            out.append(word)
+        elif (page, block, par, line) == prev:
+            out.append(' ' + word)
+        elif (page, block, par) == prev[:3]:
+            out.append('\n' + word)
+        else:
+            out.append('\n\n' + word)
+        prev = (page, block, par, line)
+    return ''.join(out) + '\n' if out else ''
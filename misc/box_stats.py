@@ -1,34 +1,122 @@
 #!/usr/bin/env python
+'''Width/height statistics over Tesseract box files.
+Usage:
+    python -m misc.box_stats [-j JOBS] [-o table.tsv] path/to/boxes/ a.box b.box ...
+Directories are scanned for *.box files. Each file is histogrammed in a
+worker process; the per-glyph histograms are merged into one table with a
+row per glyph plus an <all> row, which is what we tune scaling against.
+'''
+import argparse
+import glob
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from collections import defaultdict
+import numpy as np
 
-from misc.box import load_box_file
+from misc.box import load_box_array
 
-def box_widths(boxes, path):
-    """Returns a dict mapping box width -> count."""
-    counts = defaultdict(int)
-    for box in boxes:
-        width = box.right - box.left
-        if 16 <= width and width <= 19:
-            sys.stderr.write('%s: %s %s\n' % (width, path, box))
-        counts[width] += 1
-    return counts
+ALL_GLYPHS = '<all>'
+PERCENTILES = (5, 50, 95)
 
 
-def counts_to_list(counts):
-    high_val = max(counts.keys())
-    return [counts[x] for x in range(0, high_val + 1)]
+def glyph_histograms(letters, boxes):
+    """Returns (glyphs, width_hist, height_hist), where row i of each
+    histogram counts box sizes for glyphs[i]."""
+    widths = np.maximum(boxes['right'] - boxes['left'], 0)
+    heights = np.maximum(boxes['top'] - boxes['bottom'], 0)
+    glyphs, inverse = np.unique(letters, return_inverse=True)
+    return glyphs, _hist2d(inverse, widths, len(glyphs)), _hist2d(inverse, heights, len(glyphs))
 
 
-if __name__ == '__main__':
-    count_lists = []
-    for path in sys.argv[1:]:
-        boxes = load_box_file(path)
-        count_lists.append(counts_to_list(box_widths(boxes, path)))
+def _hist2d(rows, values, n_rows):
+    n_cols = int(values.max()) + 1 if len(values) else 1
+    flat = np.bincount(rows * n_cols + values, minlength=n_rows * n_cols)
+    return flat.reshape(n_rows, n_cols)
+
+
+def box_file_stats(path):
+    letters, boxes = load_box_array(path)
+    return glyph_histograms(letters, boxes)
+
+
+def merge_histograms(results):
+    """Merge per-file (glyphs, width_hist, height_hist) into one triple."""
+    results = list(results)
+    glyphs = np.unique(np.concatenate([r[0] for r in results])) if results else np.array([], dtype=np.str_)
+    n_w = max([r[1].shape[1] for r in results] or [1])
+    n_h = max([r[2].shape[1] for r in results] or [1])
+    width_hist = np.zeros((len(glyphs), n_w), dtype=np.int64)
+    height_hist = np.zeros((len(glyphs), n_h), dtype=np.int64)
+    for g, w, h in results:
+        idx = np.searchsorted(glyphs, g)
+        width_hist[idx, :w.shape[1]] += w
+        height_hist[idx, :h.shape[1]] += h
+    return glyphs, width_hist, height_hist
+
+
+def summarize(hist):
+    """Count, mean, std and PERCENTILES for each row of a histogram."""
+    bins = np.arange(hist.shape[1])
+    count = hist.sum(axis=1)
+    safe = np.maximum(count, 1)
+    mean = (hist * bins).sum(axis=1) / safe
+    std = np.sqrt(np.maximum((hist * bins ** 2).sum(axis=1) / safe - mean ** 2, 0))
+    cdf = np.cumsum(hist, axis=1)
+    pcts = [np.argmax(cdf >= np.ceil(count[:, None] * p / 100.0), axis=1) for p in PERCENTILES]
+    return count, mean, std, pcts
+
+
+def write_table(out, glyphs, width_hist, height_hist):
+    glyphs = [ALL_GLYPHS] + list(glyphs)
+    width_hist = np.vstack([width_hist.sum(axis=0), width_hist])
+    height_hist = np.vstack([height_hist.sum(axis=0), height_hist])
 
-    max_width = max(len(x) for x in count_lists)
+    columns = ['glyph', 'count']
+    for dim in ('width', 'height'):
+        columns += ['%s_mean' % dim, '%s_std' % dim] + ['%s_p%02d' % (dim, p) for p in PERCENTILES]
+    out.write('\t'.join(columns) + '\n')
 
-    print('\t'.join([''] + [str(x) for x in range(0, max_width)]))
-    for path, counts in zip(sys.argv[1:], count_lists):
-        print('%s\t%s' % (path, '\t'.join(str(x) for x in counts)))
\ No newline at end of file
+    count, w_mean, w_std, w_pcts = summarize(width_hist)
+    _, h_mean, h_std, h_pcts = summarize(height_hist)
+    for i, glyph in enumerate(glyphs):
+        row = [glyph, str(count[i]), '%.2f' % w_mean[i], '%.2f' % w_std[i]]
+        row += [str(p[i]) for p in w_pcts]
+        row += ['%.2f' % h_mean[i], '%.2f' % h_std[i]]
+        row += [str(p[i]) for p in h_pcts]
+        out.write('\t'.join(row) + '\n')
+
+
+def expand_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for p in sorted(glob.iglob(os.path.join(path, '**', '*.box'), recursive=True)):
+                yield p
+        else:
+            yield path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('paths', nargs='+', help='box files or directories of *.box files')
+    ap.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    ap.add_argument('-o', '--output', help='write the table here instead of stdout')
+    args = ap.parse_args()
+
+    paths = list(expand_paths(args.paths))
+    jobs = args.jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(paths) // (4 * jobs))
+        results = pool.map(box_file_stats, paths, chunksize=chunksize)
+        glyphs, width_hist, height_hist = merge_histograms(results)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        write_table(out, glyphs, width_hist, height_hist)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
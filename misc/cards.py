@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+'''Find every ID card on a scanned sheet and extract each one.
+Usage:
+    python -m misc.cards -i path/to/sheet.jpg
+Prints one JSON record per card: its document type, the extracted fields and
+the (x1, y1, x2, y2) rectangle it was cropped from.
+
+crop_morphology only keeps the single largest border, so a sheet holding an
+Aadhaar front and back (or a PAN next to an Aadhaar) comes out as one blob.
+Here every convex quadrilateral with a plausible card aspect ratio is kept,
+perspective-corrected onto a flat card raster (misc/rectify.py), and run
+through engine.extract concurrently. Tesseract runs as a
+subprocess and OpenCV releases the GIL, so threads are enough.
+'''
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from misc import cpu, engine, metrics, orientation, rectify
+
+# ID-1 cards (Aadhaar, PAN, DL) are 85.6 x 54 mm; passport pages are wider.
+MIN_ASPECT = 1.2
+MAX_ASPECT = 2.0
+MIN_AREA_FRAC = 0.04
+DETECT_DIM = 1024
+
+
+def _scale_down(image, max_dim=DETECT_DIM):
+    h, w = image.shape[:2]
+    scale = min(1.0, 1.0 * max_dim / max(h, w))
+    if scale < 1.0:
+        image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return scale, image
+
+
+def _is_card(quad, area):
+    if len(quad) != 4 or not cv2.isContourConvex(quad):
+        return False
+    (_, _), (w, h), _ = cv2.minAreaRect(quad)
+    if min(w, h) == 0 or w * h < MIN_AREA_FRAC * area:
+        return False
+    aspect = max(w, h) / min(w, h)
+    return MIN_ASPECT <= aspect <= MAX_ASPECT
+
+
+def _contains(outer, inner):
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            outer[2] >= inner[2] and outer[3] >= inner[3])
+
+
+def find_cards(image):
+    """Find card-shaped quadrilaterals in a BGR or grayscale image.
+    Returns a list of (quad, rect) in full-resolution coordinates, where quad
+    is a 4x2 int array of corners and rect is (x1, y1, x2, y2), ordered top
+    to bottom then left to right. Cards nested inside another card (printed
+    frames, photo boxes) are dropped.
+    """
+    scale, small = _scale_down(engine.to_gray(image))
+    area = small.shape[0] * small.shape[1]
+
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=2)
+    contours = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+    found = []
+    for c in contours:
+        quad = cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)
+        if not _is_card(quad, area):
+            continue
+        quad = (quad.reshape(4, 2) / scale).astype(np.int32)
+        x, y, w, h = cv2.boundingRect(quad)
+        found.append((quad, (x, y, x + w - 1, y + h - 1)))
+
+    found.sort(key=lambda q_r: -(q_r[1][2] - q_r[1][0]) * (q_r[1][3] - q_r[1][1]))
+    cards = []
+    for quad, rect in found:
+        if not any(_contains(kept, rect) for _, kept in cards):
+            cards.append((quad, rect))
+    cards.sort(key=lambda q_r: (q_r[1][1], q_r[1][0]))
+    return cards
+
+
+def crop_rect(image, rect):
+    x1, y1, x2, y2 = rect
+    h, w = image.shape[:2]
+    return image[max(0, y1):min(h, y2 + 1), max(0, x1):min(w, x2 + 1)]
+
+
+def extract_cards(image, mode='thresh', lang='eng', max_workers=None, cache=None, orient=False):
+    """Detect every card in image and extract each one concurrently.
+    Returns a list of engine.Extraction with rect set. If no card outline is
+    found the whole image is treated as a single card. cache is passed to
+    engine.extract() for each crop. orient=True turns the whole sheet the
+    right way up once, before cards are found; rects are then in the
+    turned sheet's coordinates. The thread count comes from the cpu layout
+    (misc/cpu.py, max_workers overrides it) and is capped at the number of
+    cards.
+    """
+    if orient:
+        image, _ = orientation.upright(image)
+    with metrics.timed('crop'):
+        cards = find_cards(image)
+    metrics.count('cards', len(cards))
+    if not cards:
+        h, w = image.shape[:2]
+        cards = [(None, (0, 0, w - 1, h - 1))]
+
+    def run(card):
+        quad, rect = card
+        crop = crop_rect(image, rect) if quad is None else rectify.warp_card(image, quad)
+        record = engine.extract(crop, mode=mode, lang=lang, cache=cache)
+        record.rect = rect
+        return record
+
+    with ThreadPoolExecutor(max_workers=cpu.plan(max_workers, len(cards)).workers) as pool:
+        return list(pool.map(run, cards))
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-i", "--image", required=True, help="path to a scan holding one or more cards")
+    ap.add_argument("-p", "--preprocess", type=str, default="thresh", choices=engine.PREPROCESS_MODES,
+                    help="type of preprocessing applied to each card")
+    args = ap.parse_args()
+
+    image = engine.load_image(args.image)
+    records = extract_cards(image, mode=args.preprocess)
+    print(json.dumps([r.to_dict() for r in records], ensure_ascii=False, indent=4))
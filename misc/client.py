@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''Thin client for misc/daemon.py.
+Usage:
+    python misc/client.py -i card.jpg [-p thresh] [-t PAN] [--cards] [--gate] [--orient] [--warp] [--socket PATH]
+Sends the request to the resident daemon and prints its JSON reply. Only
+the standard library is imported up front; if no daemon is listening, or
+its reply is not valid JSON, the request runs in-process, importing the
+pipeline at that point.
+'''
+
+import json
+import os
+import socket
+import sys
+
+
+def default_socket_path():
+    return os.environ.get('DOCOCR_SOCKET') or '/tmp/dococr-%d.sock' % os.getuid()
+
+
+def send(request, path=None):
+    """Send one request to the daemon and return the decoded reply.
+    Raises OSError if no daemon is listening on path, ValueError if the
+    reply is not JSON (cut short, or not from the daemon)."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or default_socket_path())
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        reply = sock.makefile('rb').readline()
+    finally:
+        sock.close()
+    return json.loads(reply.decode('utf-8'))
+
+
+def run_local(request):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from misc.daemon import handle_request
+    return handle_request(request)
+
+
+def main(argv):
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-i", "--image", required=True, help="path to input image to be OCR'd")
+    ap.add_argument("-p", "--preprocess", type=str, default="thresh", help="type of preprocessing to be done")
+    ap.add_argument("-t", "--type", help="document type (default: classify from the text)")
+    ap.add_argument("--cards", action="store_true", help="the image holds several cards")
+    ap.add_argument("--gate", action="store_true", help="reject blurry, glared, flat or low-resolution images before OCR")
+    ap.add_argument("--orient", action="store_true", help="turn sideways or upside-down images the right way up first")
+    ap.add_argument("--warp", action="store_true", help="perspective-correct the card to a flat 1011x638 raster")
+    ap.add_argument("--socket", help="daemon socket (default: $DOCOCR_SOCKET or /tmp/dococr-UID.sock)")
+    args = ap.parse_args(argv)
+
+    request = {'image': os.path.abspath(args.image), 'preprocess': args.preprocess,
+               'type': args.type, 'cards': args.cards, 'gate': args.gate,
+               'orient': args.orient, 'warp': args.warp}
+    try:
+        reply = send(request, args.socket)
+    except (OSError, ValueError):
+        reply = run_local(request)
+    print(json.dumps(reply, ensure_ascii=False, indent=4))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
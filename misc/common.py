@@ -17,11 +17,24 @@ import cv2 as cv
 
 # built-in modules
 import os
+import glob
 import itertools as it
 from contextlib import contextmanager
 
 image_extensions = ['.bmp', '.jpg', '.jpeg', '.png', '.tif', '.tiff', '.pbm', '.pgm', '.ppm']
 
+def expand_paths(paths, extensions=image_extensions):
+    """Files named by paths: directories are searched recursively for files
+    with one of extensions, globs are expanded, anything else is passed on."""
+    for path in paths:
+        if os.path.isdir(path):
+            for p in sorted(glob.iglob(os.path.join(path, '**', '*'), recursive=True)):
+                if os.path.splitext(p)[1].lower() in extensions:
+                    yield p
+        else:
+            for p in sorted(glob.glob(path)) or [path]:
+                yield p
+
 class Bunch(object):
     def __init__(self, **kw):
         self.__dict__.update(kw)
@@ -143,13 +156,19 @@ def clock():
     return cv.getTickCount() / cv.getTickFrequency()
 
 @contextmanager
-def Timer(msg):
-    print(msg, '...',)
+def Timer(msg, record=None):
+    """Time the body. Prints the elapsed ms, or passes the elapsed seconds
+    to record() instead when one is given."""
+    if record is None:
+        print(msg, '...',)
     start = clock()
     try:
         yield
     finally:
-        print("%.2f ms" % ((clock()-start)*1000))
+        if record is None:
+            print("%.2f ms" % ((clock()-start)*1000))
+        else:
+            record(clock()-start)
 
 class StatValue:
     def __init__(self, smooth_coef = 0.5):
@@ -0,0 +1,126 @@
+'''
+One CPU budget for OpenCV, Tesseract and the worker pool.
+
+Left alone, every worker process sizes OpenCV's thread pool to the whole
+machine, and every Tesseract it spawns starts an OpenMP team of the same
+size, so eight batch workers on eight cores run well over a hundred busy
+threads and throughput falls instead of rising. Most of a document's time
+is the Tesseract pass, which parallelises far better across documents than
+within one, so plan() gives each core a worker and each worker one thread,
+and only hands out more threads per worker when there are fewer documents
+(or jobs) than cores.
+
+    layout = cpu.plan(jobs=args.jobs, tasks=len(paths))
+    layout.apply()                 # this process: env + cv2 + gauges
+    ProcessPoolExecutor(layout.workers, initializer=cpu.init_worker,
+                        initargs=layout.thread_args())
+
+Cores are what this process may actually use: its CPU affinity and, in a
+container, the cgroup CPU quota.
+
+The daemon and the web app run their requests on threads of one process
+instead, and the stages that run in the interpreter (parsing, text
+cleanup) hold the GIL: with a fraction p of each document spent there, no
+more than 1/p requests make progress at once. plan(threaded=True) caps the
+concurrent requests there, from the stage mix, and gives the rest of the
+cores to their OpenCV and Tesseract threads.
+'''
+
+import math
+import os
+
+import cv2
+
+from misc import metrics
+
+# Tesseract's LSTM gains little past about four OpenMP threads.
+MAX_OMP_THREADS = 4
+# Stages that hold the GIL; OpenCV releases it and Tesseract is a subprocess.
+PYTHON_STAGES = ('parse',)
+# Stages that only wrap others (their time is already counted inside).
+WRAPPER_STAGES = ('batch', 'extract')
+# Seconds per stage for a typical card, used when no measured mix is given.
+TYPICAL_MIX = {'decode': 0.01, 'preprocess': 0.01, 'ocr': 1.0, 'parse': 0.05}
+
+
+def cgroup_cpus(path='/sys/fs/cgroup/cpu.max'):
+    """CPUs allowed by a cgroup v2 quota ("quota period"), or None."""
+    try:
+        with open(path) as f:
+            quota, period = f.read().split()[:2]
+    except (IOError, ValueError):
+        return None
+    if quota == 'max':
+        return None
+    return max(1, int(int(quota) / int(period)))
+
+
+def available_cores():
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = cgroup_cpus()
+    return min(cores, quota) if quota else cores
+
+
+class Layout(object):
+    """How the cores are split: workers processes (or concurrent requests),
+    each with cv_threads OpenCV threads and omp_threads per Tesseract."""
+    def __init__(self, cores, workers, cv_threads, omp_threads):
+        self.cores = cores
+        self.workers = workers
+        self.cv_threads = cv_threads
+        self.omp_threads = omp_threads
+
+    def thread_args(self):
+        return (self.cv_threads, self.omp_threads)
+
+    def apply(self):
+        """Use the layout in this process and publish it as gauges."""
+        init_worker(self.cv_threads, self.omp_threads)
+        for name, value in self.to_dict().items():
+            metrics.set_gauge('cpu_' + name, value)
+
+    def to_dict(self):
+        return {'cores': self.cores, 'workers': self.workers,
+                'cv_threads': self.cv_threads, 'omp_threads': self.omp_threads}
+
+    def __repr__(self):
+        return 'Layout(%d cores: %d workers x %d cv / %d omp threads)' % (
+            self.cores, self.workers, self.cv_threads, self.omp_threads)
+
+
+def python_share(mix):
+    """Fraction of the time in mix (stage -> seconds, e.g. the stage totals of
+    a metrics summary) spent in PYTHON_STAGES."""
+    total = sum(seconds for stage, seconds in mix.items() if stage not in WRAPPER_STAGES)
+    if not total:
+        return 0.0
+    return sum(mix.get(stage, 0) for stage in PYTHON_STAGES) / float(total)
+
+
+def plan(jobs=None, tasks=None, cores=None, threaded=False, mix=None):
+    """Split cores between workers and threads. jobs overrides the worker
+    count; tasks (documents to run, if known) caps it, since idle workers
+    only hold threads back from busy ones. With threaded=True the workers
+    are threads of this process, capped by the GIL-bound share of mix
+    (TYPICAL_MIX by default) unless jobs is given."""
+    cores = cores or available_cores()
+    workers = jobs or cores
+    if threaded and not jobs:
+        share = python_share(TYPICAL_MIX if mix is None else mix)
+        if share:
+            workers = min(workers, int(math.ceil(1 / share)))
+    if tasks:
+        workers = min(workers, tasks)
+    workers = max(1, workers)
+    threads = max(1, cores // workers)
+    return Layout(cores, workers, threads, min(threads, MAX_OMP_THREADS))
+
+
+def init_worker(cv_threads, omp_threads):
+    """Pool initializer: size OpenCV's pool and, through the environment
+    the Tesseract subprocesses inherit, their OpenMP teams."""
+    os.environ['OMP_THREAD_LIMIT'] = str(omp_threads)
+    cv2.setNumThreads(cv_threads)
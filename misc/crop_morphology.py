@@ -1,27 +1,41 @@
 #!/usr/bin/env python
 '''Crop an image to just the portions containing text.
 Usage:
-    ./crop_morphology.py path/to/image.jpg
-This will place the cropped image in path/to/image.crop.png.
+    python -m misc.crop_morphology [-j JOBS] [-o rects.jsonl|rects.db|dir/]
+                                   [--debug DIR] [--debug-rate 0.01] images/ a.jpg ...
+Writes one record per image, {"File": path, "Crop": [x1, y1, x2, y2]}
+("Crop": null when no text was found), to the chosen sink (JSON lines on
+stdout by default). Images are spread over worker processes sharing one CPU
+budget (misc/cpu.py). The rectangles are in the original image's pixels;
+cropping (or not) is left to whatever reads them, so nothing is re-encoded.
+--debug DIR saves a render of the components (blue) and the crop (red) for
+a fixed sample of --debug-rate of the images.
+
+From code:
+    rect = crop_morphology.crop(image)      # BGR or grayscale array
+
 For details on the methodology, see
 http://www.danvk.org/2015/01/07/finding-blocks-of-text-in-an-image-using-python-opencv-and-numpy.html
 Script created by Dan Vanderkam (https://github.com/danvk)
 Adapted to Python 3 by Lui Pillmann (https://github.com/luipillmann)
 '''
 
-import glob
+import argparse
+import json
 import os
-import random
 import sys
-import random
-import math
-import json
-from collections import defaultdict
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import cv2
-from PIL import Image, ImageDraw
 import numpy as np
-from scipy.ndimage.filters import rank_filter
+
+from misc import cpu, metrics
+from misc.common import expand_paths
+from misc.sinks import open_sink
+
+MAX_DIM = 2048
 
 
 def dilate(ary, N, iterations):
@@ -97,7 +111,7 @@ def remove_border(contour, ary):
     degs = r[2]
     if angle_from_right(degs) <= 10.0:
         box = cv2.boxPoints(r)
-        box = np.int0(box)
+        box = np.intp(box)
         cv2.drawContours(c_im, [box], 0, 255, -1)
         cv2.drawContours(c_im, [box], 0, 0, 4)
     else:
@@ -121,7 +135,7 @@ def find_components(edges, max_components=16):
         n += 1
         dilated_image = dilate(edges, N=3, iterations=n)
         dilated_image = np.uint8(dilated_image)
-        _, contours, hierarchy = cv2.findContours(dilated_image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        contours, hierarchy = cv2.findContours(dilated_image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2:]
         count = len(contours)
     # print dilation
     # Image.fromarray(edges).show()
@@ -129,67 +143,89 @@ def find_components(edges, max_components=16):
     return contours
 
 
-def find_optimal_components_subset(contours, edges):
+def find_optimal_components_subset(contours, edges, verbose=False):
     """Find a crop which strikes a good balance of coverage/compactness.
     Returns an (x1, y1, x2, y2) tuple.
+
+    Greedy: each round scores every remaining component at once (the union
+    with the current crop, its recall, precision and F1, as numpy arrays)
+    and takes the first one, in order of pixel count, that is worth adding.
+    verbose=True prints each accepted component.
     """
     c_info = props_for_contours(contours, edges)
     c_info.sort(key=lambda x: -x['sum'])
+    boxes = np.array([[c['x1'], c['y1'], c['x2'], c['y2']] for c in c_info], dtype=np.int64)
+    sums = np.array([c['sum'] for c in c_info], dtype=np.float64)
     total = np.sum(edges) / 255
     area = edges.shape[0] * edges.shape[1]
 
-    c = c_info[0]
-    del c_info[0]
-    this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-    crop = this_crop
-    covered_sum = c['sum']
+    crop = tuple(int(v) for v in boxes[0])
+    covered_sum = sums[0]
+    left = np.ones(len(boxes), dtype=bool)
+    left[0] = False
 
-    while covered_sum < total:
-        changed = False
+    while covered_sum < total and left.any():
         recall = 1.0 * covered_sum / total
         prec = 1 - 1.0 * crop_area(crop) / area
         f1 = 2 * (prec * recall / (prec + recall))
-        # print '----'
-        for i, c in enumerate(c_info):
-            this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-            new_crop = union_crops(crop, this_crop)
-            new_sum = covered_sum + c['sum']
-            new_recall = 1.0 * new_sum / total
-            new_prec = 1 - 1.0 * crop_area(new_crop) / area
+
+        idx = np.flatnonzero(left)
+        cand = boxes[idx]
+        new_crops = np.column_stack((np.minimum(cand[:, 0], crop[0]), np.minimum(cand[:, 1], crop[1]),
+                                     np.maximum(cand[:, 2], crop[2]), np.maximum(cand[:, 3], crop[3])))
+        new_areas = (np.maximum(0, new_crops[:, 2] - new_crops[:, 0]) *
+                     np.maximum(0, new_crops[:, 3] - new_crops[:, 1]))
+        new_sums = covered_sum + sums[idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new_recall = new_sums / total
+            new_prec = 1 - new_areas / float(area)
             new_f1 = 2 * new_prec * new_recall / (new_prec + new_recall)
 
-            # Add this crop if it improves f1 score,
+            # Add a component if it improves f1 score,
             # _or_ it adds 25% of the remaining pixels for <15% crop expansion.
             # ^^^ very ad-hoc! make this smoother
-            remaining_frac = c['sum'] / (total - covered_sum)
-            new_area_frac = 1.0 * crop_area(new_crop) / crop_area(crop) - 1
-            if new_f1 > f1 or (
-                    remaining_frac > 0.25 and new_area_frac < 0.15):
-                print('%d %s -> %s / %s (%s), %s -> %s / %s (%s), %s -> %s' % (
-                    i, covered_sum, new_sum, total, remaining_frac,
-                    crop_area(crop), crop_area(new_crop), area, new_area_frac,
-                    f1, new_f1))
-                crop = new_crop
-                covered_sum = new_sum
-                del c_info[i]
-                changed = True
-                break
-
-        if not changed:
+            remaining_frac = sums[idx] / (total - covered_sum)
+            new_area_frac = new_areas / float(crop_area(crop)) - 1
+            accept = (new_f1 > f1) | ((remaining_frac > 0.25) & (new_area_frac < 0.15))
+        if not accept.any():
             break
+        j = int(np.argmax(accept))
+        new_crop = tuple(int(v) for v in new_crops[j])
+        if verbose:
+            print('%d %s -> %s / %s (%s), %s -> %s / %s (%s), %s -> %s' % (
+                j, covered_sum, new_sums[j], total, remaining_frac[j],
+                crop_area(crop), new_areas[j], area, new_area_frac[j],
+                f1, new_f1[j]))
+        crop = new_crop
+        covered_sum = new_sums[j]
+        left[idx[j]] = False
 
     return crop
 
 
-def pad_crop(crop, contours, edges, border_contour, pad_px=15):
+def contour_boxes(contours):
+    """(x1, y1, x2, y2) bounding boxes of contours as an (n, 4) int array."""
+    boxes = np.zeros((len(contours), 4), dtype=np.int64)
+    for i, c in enumerate(contours):
+        x, y, w, h = cv2.boundingRect(c)
+        boxes[i] = x, y, x + w - 1, y + h - 1
+    return boxes
+
+
+def pad_crop(crop, contours, edges, border_contour, pad_px=15, max_rounds=10, verbose=False):
     """Slightly expand the crop to get full contours.
     This will expand to include any contours it currently intersects, but will
     not expand past a border.
+
+    The contour boxes are computed once and sorted by x1, so each round only
+    looks at the boxes starting left of the crop's right edge. Every box the
+    crop cuts through is added at once and the result padded again, for at
+    most max_rounds rounds.
     """
-    bx1, by1, bx2, by2 = 0, 0, edges.shape[0], edges.shape[1]
+    bx1, by1, bx2, by2 = 0, 0, edges.shape[1] - 1, edges.shape[0] - 1
     if border_contour is not None and len(border_contour) > 0:
-        c = props_for_contours([border_contour], edges)[0]
-        bx1, by1, bx2, by2 = c['x1'] + 5, c['y1'] + 5, c['x2'] - 5, c['y2'] - 5
+        x1, y1, x2, y2 = contour_boxes([border_contour])[0]
+        bx1, by1, bx2, by2 = x1 + 5, y1 + 5, x2 - 5, y2 - 5
 
     def crop_in_border(crop):
         x1, y1, x2, y2 = crop
@@ -197,112 +233,167 @@ def pad_crop(crop, contours, edges, border_contour, pad_px=15):
         y1 = max(y1 - pad_px, by1)
         x2 = min(x2 + pad_px, bx2)
         y2 = min(y2 + pad_px, by2)
-        return crop
+        return int(x1), int(y1), int(x2), int(y2)
 
     crop = crop_in_border(crop)
 
-    c_info = props_for_contours(contours, edges)
-    changed = False
-    for c in c_info:
-        this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-        this_area = crop_area(this_crop)
-        int_area = crop_area(intersect_crops(crop, this_crop))
-        new_crop = crop_in_border(union_crops(crop, this_crop))
-        if 0 < int_area < this_area and crop != new_crop:
+    boxes = contour_boxes(contours)
+    boxes = boxes[np.argsort(boxes[:, 0], kind='stable')]
+    areas = np.maximum(0, boxes[:, 2] - boxes[:, 0]) * np.maximum(0, boxes[:, 3] - boxes[:, 1])
+    for _ in range(max_rounds):
+        x1, y1, x2, y2 = crop
+        near = boxes[:np.searchsorted(boxes[:, 0], x2, side='right')]
+        int_area = (np.maximum(0, np.minimum(near[:, 2], x2) - np.maximum(near[:, 0], x1)) *
+                    np.maximum(0, np.minimum(near[:, 3], y2) - np.maximum(near[:, 1], y1)))
+        cut = near[(int_area > 0) & (int_area < areas[:len(near)])]
+        if not len(cut):
+            break
+        new_crop = crop_in_border(union_crops(crop, (cut[:, 0].min(), cut[:, 1].min(),
+                                                     cut[:, 2].max(), cut[:, 3].max())))
+        if new_crop == crop:
+            break
+        if verbose:
             print('%s -> %s' % (str(crop), str(new_crop)))
-            changed = True
-            crop = new_crop
+        crop = new_crop
+    return crop
 
-    if changed:
-        return pad_crop(crop, contours, edges, border_contour, pad_px)
-    else:
-        return crop
+
+def deborder(edges, size=20, min_px=4):
+    """Remove ~1px borders from a 0/255 edge map: keep the edge pixels with
+    at least min_px set pixels in both the size-long row and column windows
+    around them. This is the old rank_filter(edges, -min_px, size=(1, size))
+    (and (size, 1)) test, counted with an unnormalised box filter."""
+    ones = (edges > 0).astype(np.uint8)
+    rows = cv2.boxFilter(ones, -1, (size, 1), normalize=False, borderType=cv2.BORDER_REFLECT)
+    cols = cv2.boxFilter(ones, -1, (1, size), normalize=False, borderType=cv2.BORDER_REFLECT)
+    return 255 * ((ones > 0) & (rows >= min_px) & (cols >= min_px)).astype(np.uint8)
 
 
-def downscale_image(im, max_dim=2048):
-    """Shrink im until its longest dimension is <= max_dim.
-    Returns new_image, scale (where scale <= 1).
+def downscale(image, max_dim=MAX_DIM):
+    """Shrink image until its longest dimension is <= max_dim.
+    Returns scale, new_image (where scale <= 1).
     """
-    a, b = im.size
-    if max(a, b) <= max_dim:
-        return 1.0, im
-
-    scale = 1.0 * max_dim / max(a, b)
-    new_im = im.resize((int(a * scale), int(b * scale)), Image.ANTIALIAS)
-    return scale, new_im
-
-
-def process_image(path, out_path):
-    orig_im = Image.open(path)
-    scale, im = downscale_image(orig_im)
-
-    edges = cv2.Canny(np.asarray(im), 100, 200)
-
-    # TODO: dilate image _before_ finding a border. This is crazy sensitive!
-    _, contours, hierarchy = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    borders = find_border_components(contours, edges)
-    borders.sort(
-        key=lambda i_x1_y1_x2_y2: (i_x1_y1_x2_y2[3] - i_x1_y1_x2_y2[1]) * (i_x1_y1_x2_y2[4] - i_x1_y1_x2_y2[2]))
-
-    border_contour = None
-    if len(borders):
-        border_contour = contours[borders[0][0]]
-        edges = remove_border(border_contour, edges)
-
-    edges = 255 * (edges > 0).astype(np.uint8)
-
-    # Remove ~1px borders using a rank filter.
-    maxed_rows = rank_filter(edges, -4, size=(1, 20))
-    maxed_cols = rank_filter(edges, -4, size=(20, 1))
-    debordered = np.minimum(np.minimum(edges, maxed_rows), maxed_cols)
-    edges = debordered
-
-    contours = find_components(edges)
-    if len(contours) == 0:
-        print('%s -> (no text!)' % path)
-        return
-
-    crop = find_optimal_components_subset(contours, edges)
-    crop = pad_crop(crop, contours, edges, border_contour)
-
-    crop = [int(x / scale) for x in crop]  # upscale to the original image size.
-
-    # draw = ImageDraw.Draw(im)
-    # c_info = props_for_contours(contours, edges)
-    # for c in c_info:
-    #    this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-    #    draw.rectangle(this_crop, outline='blue')
-    # draw.rectangle(crop, outline='red')
-    # im.save(out_path)
-    # draw.text((50, 50), path, fill='red')
-    # orig_im.save(out_path)
-    # im.show()
-    text_im = orig_im.crop(crop)
-    text_im.save(out_path)
-    print('%s -> %s' % (path, out_path))
+    h, w = image.shape[:2]
+    if max(h, w) <= max_dim:
+        return 1.0, image
+
+    scale = 1.0 * max_dim / max(h, w)
+    return scale, cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def crop(image, max_dim=MAX_DIM, debug=None):
+    """(x1, y1, x2, y2) of the text in image, a BGR or grayscale array, in
+    image's own pixels; None when there is no text. debug, if given, is
+    called as debug(image, boxes, rect) with the component boxes."""
+    with metrics.timed('text_crop'):
+        scale, small = downscale(image, max_dim)
+        edges = cv2.Canny(small, 100, 200)
+
+        # TODO: dilate image _before_ finding a border. This is crazy sensitive!
+        contours = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        borders = find_border_components(contours, edges)
+        borders.sort(key=lambda b: (b[3] - b[1]) * (b[4] - b[2]))
+
+        border_contour = None
+        if len(borders):
+            border_contour = contours[borders[0][0]]
+            edges = remove_border(border_contour, edges)
+
+        edges = deborder(255 * (edges > 0).astype(np.uint8))
+
+        contours = find_components(edges)
+        if len(contours) == 0:
+            metrics.count('text_crop_empty')
+            return None
+
+        rect = find_optimal_components_subset(contours, edges)
+        rect = pad_crop(rect, contours, edges, border_contour)
+        rect = tuple(int(x / scale) for x in rect)  # upscale to the original image size.
+    if debug is not None:
+        debug(image, (contour_boxes(contours) / scale).astype(int), rect)
+    return rect
+
+
+def render(image, boxes, rect):
+    """A BGR copy of image with the component boxes in blue and the crop
+    rectangle in red."""
+    out = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image.copy()
+    for x1, y1, x2, y2 in boxes:
+        cv2.rectangle(out, (int(x1), int(y1)), (int(x2), int(y2)), (255, 0, 0), 2)
+    cv2.rectangle(out, tuple(rect[:2]), tuple(rect[2:]), (0, 0, 255), 3)
+    return out
+
+
+def sampled(path, rate):
+    """Whether path is in the debug sample. The choice hashes the path, so
+    reruns render the same images."""
+    return rate > 0 and zlib.crc32(path.encode('utf-8')) % 10000 < rate * 10000
+
+
+def save_render(out_path, image, boxes, rect):
+    """crop()'s debug hook: write render() to out_path."""
+    cv2.imwrite(out_path, render(image, boxes, rect))
+
+
+def render_path(debug_dir, path):
+    """Where the render of path goes: its path relative to the working
+    directory, flattened, so same-named images in different directories
+    don't overwrite each other."""
+    name = os.path.splitext(os.path.relpath(path))[0].replace(os.sep, '__')
+    return os.path.join(debug_dir, name + '.crop.jpg')
+
+
+def crop_path(path, debug_dir=None, debug_rate=0.0):
+    """The crop record for one image file."""
+    debug = None
+    if debug_dir and sampled(path, debug_rate):
+        debug = partial(save_render, render_path(debug_dir, path))
+
+    image = cv2.imread(path)
+    if image is None:
+        metrics.count('errors')
+        return {'File': path, 'Error': 'could not decode image'}
+    try:
+        rect = crop(image, debug=debug)
+    except Exception as e:
+        metrics.count('errors')
+        return {'File': path, 'Error': '%s: %s' % (type(e).__name__, e)}
+    return {'File': path, 'Crop': list(rect) if rect else None}
+
+
+def process_path(path, debug_dir=None, debug_rate=0.0):
+    """crop_path in a worker: (record, metrics state)."""
+    return crop_path(path, debug_dir, debug_rate), metrics.REGISTRY.drain()
+
+
+def run(paths, sink, jobs=None, debug_dir=None, debug_rate=0.0):
+    n = len(paths)
+    layout = cpu.plan(jobs, n)
+    layout.apply()
+    with ProcessPoolExecutor(max_workers=layout.workers, initializer=cpu.init_worker,
+                             initargs=layout.thread_args()) as pool:
+        for record, state in pool.map(process_path, paths, [debug_dir] * n, [debug_rate] * n):
+            metrics.REGISTRY.merge(state)
+            sink.write(record)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('paths', nargs='+', help='images, globs or directories of them')
+    ap.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: one per usable core, see misc/cpu.py)')
+    ap.add_argument('-o', '--output', default='-', help='where to write records: - (stdout), *.jsonl, *.db or a directory/')
+    ap.add_argument('--debug', metavar='DIR', help='save renders of the components and crop for a sample of images to DIR')
+    ap.add_argument('--debug-rate', type=float, default=0.01, help='fraction of images rendered with --debug')
+    args = ap.parse_args()
+
+    paths = list(expand_paths(args.paths))
+    if args.debug:
+        os.makedirs(args.debug, exist_ok=True)
+    with open_sink(args.output, indent=None) as sink:
+        with metrics.timed('batch'):
+            run(paths, sink, jobs=args.jobs, debug_dir=args.debug, debug_rate=args.debug_rate)
+    sys.stderr.write(json.dumps(metrics.REGISTRY.summary(), indent=4) + '\n')
 
-'''
-if __name__ == '__main__':
-    if len(sys.argv) == 2 and '*' in sys.argv[1]:
-        files = glob.glob(sys.argv[1])
-        random.shuffle(files)
-    else:
-        files = sys.argv[1:]
-
-    for path in files:
-        out_path = path.replace('.jpg', '.crop.png')
-        # out_path = path.replace('.png', '.crop.png')  # .png as input
-        if os.path.exists(out_path): continue
-        try:
-            process_image(path, out_path)
-        except Exception as e:
-            print('%s %s' % (path, e))
-'''
 
 if __name__ == '__main__':
-    path = 'pan_card_template.jpg'
-    out_path = 'pancard-cropped1.jpg'
-    try:
-        process_image(path, out_path)
-    except Exception as e:
-        print('%s %s' % (path, e))
\ No newline at end of file
+    main()
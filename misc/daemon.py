@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+'''Resident extraction server on a local Unix socket.
+Usage:
+    python -m misc.daemon [--socket PATH] [-j JOBS]
+Pays the cv2 / PIL / pytesseract / ftfy import cost once and warms Tesseract
+(binary and traineddata into the page cache) with a throwaway OCR call.
+misc/client.py then forwards each request over the socket, so a per-document
+invocation costs a Python start-up plus one round trip.
+
+Protocol: the client sends one JSON object per line and gets one back.
+    {"image": "/abs/path.jpg", "preprocess": "thresh", "type": null, "cards": false, "gate": false,
+     "orient": false, "warp": false}
+The reply is the Extraction.to_dict() record (a list of them when cards is
+true), {"Rejected": reason, "Quality": {...}} when gate is true and the
+image fails misc/quality.py, or {"Error": "..."}. A card already served,
+or a near-duplicate whose numbers read the same (misc/phash.py), comes
+back from memory with "Cached": true unless the daemon runs with
+--no-cache. At most JOBS requests (default: one per usable core, capped
+by how much of a request holds the GIL) are extracted at once, each with
+its share of the cores for OpenCV and Tesseract (misc/cpu.py); the rest
+wait. A "cards" request splits its cards over only its own share.
+'''
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+
+import numpy as np
+
+from misc import cards, cpu, engine, metrics
+from misc.client import default_socket_path
+from misc.phash import HashCache
+from misc.quality import QualityError
+
+
+def handle_request(request, cache=None, threads=1):
+    """The reply to one request. threads is the request's share of the
+    cores: a sheet of cards is extracted on at most that many threads."""
+    image = engine.load_image(request['image'])
+    mode = request.get('preprocess') or 'thresh'
+    orient = bool(request.get('orient'))
+    if request.get('cards'):
+        return [r.to_dict() for r in cards.extract_cards(image, mode=mode, max_workers=threads, cache=cache,
+                                                            orient=orient)]
+    try:
+        return engine.extract(image, doc_type=request.get('type'), mode=mode, cache=cache,
+                              gate=bool(request.get('gate')), orient=orient,
+                              warp=bool(request.get('warp'))).to_dict()
+    except QualityError as e:
+        return e.to_dict()
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                with self.server.slots:
+                    reply = handle_request(json.loads(line.decode('utf-8')), self.server.cache,
+                                           self.server.threads)
+            except Exception as e:
+                metrics.count('errors')
+                reply = {'Error': '%s: %s' % (type(e).__name__, e)}
+            self.wfile.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    cache = None
+    slots = None
+    threads = 1
+
+
+def warm_up():
+    """One OCR call on a blank card-sized image, so the first real request
+    doesn't pay for loading the Tesseract binary and model from disk."""
+    try:
+        engine.extract(np.full((64, 256), 255, np.uint8))
+    except Exception as e:
+        sys.stderr.write('warm-up failed: %s\n' % e)
+    metrics.REGISTRY.drain()
+
+
+def serve(path, cache=True, jobs=None):
+    if os.path.exists(path):
+        os.unlink(path)
+    old_umask = os.umask(0o177)  # socket readable/writable by this user only
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+    if cache:
+        server.cache = HashCache()
+    layout = cpu.plan(jobs, threaded=True)
+    layout.apply()
+    server.slots = threading.BoundedSemaphore(layout.workers)
+    # Cores left to each slot, so a sheet of cards doesn't start another
+    # thread per core inside every slot.
+    server.threads = layout.cv_threads
+    warm_up()
+    # Exit through serve()'s finally on SIGTERM so the socket file is removed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write('listening on %s (%r)\n' % (path, layout))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--socket', default=default_socket_path(), help='Unix socket to listen on')
+    ap.add_argument('--no-cache', action='store_true', help='always run OCR, even for images seen before')
+    ap.add_argument('-j', '--jobs', type=int, default=None, help='requests extracted at once (default: one per usable core, see misc/cpu.py)')
+    args = ap.parse_args()
+    try:
+        serve(args.socket, cache=not args.no_cache, jobs=args.jobs)
+    except KeyboardInterrupt:
+        pass
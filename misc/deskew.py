@@ -1,57 +1,57 @@
-# import the necessary packages
-import numpy as np
+'''
+Text skew correction: the rotated bounding box of all the ink gives the
+angle the text block is turned by, and one rotation levels it.
+Usage:
+    python -m misc.deskew -i image_pan.jpg
+deskew() is timed as the 'deskew' stage (misc/metrics.py).
+'''
+
 import argparse
+
 import cv2
 
-# construct the argument parse and parse the arguments
-ap = argparse.ArgumentParser()
-ap.add_argument("-i", "--image", required=True, help="path to input image file")
-args = vars(ap.parse_args())
-
-# load the image from disk
-image = cv2.imread(args["image"])
-
-# convert the image to grayscale and flip the foreground
-# and background to ensure foreground is now "white" and
-# the background is "black"
-gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-gray = cv2.bitwise_not(gray)
-
-# threshold the image, setting all foreground pixels to
-# 255 and all background pixels to 0
-thresh = cv2.threshold(gray, 0, 255,
-                       cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-
-# grab the (x, y) coordinates of all pixel values that
-# are greater than zero, then use these coordinates to
-# compute a rotated bounding box that contains all
-# coordinates
-coords = np.column_stack(np.where(thresh > 0))
-angle = cv2.minAreaRect(coords)[-1]
-
-# the `cv2.minAreaRect` function returns values in the
-# range [-90, 0); as the rectangle rotates clockwise the
-# returned angle trends to 0 -- in this special case we
-# need to add 90 degrees to the angle
-if angle < -45:
-    angle = -(90 + angle)
-
-# otherwise, just take the inverse of the angle to make
-# it positive
-else:
-    angle = -angle
-
-# rotate the image to deskew it
-(h, w) = image.shape[:2]
-center = (w // 2, h // 2)
-M = cv2.getRotationMatrix2D(center, angle, 1.0)
-rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-
-# draw the correction angle on the image so we can validate it
-cv2.putText(rotated, "Angle: {:.2f} degrees".format(angle),(10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-# show the output image
-print("[INFO] angle: {:.3f}".format(angle))
-cv2.imshow("Input", image)
-cv2.imshow("Rotated", rotated)
-cv2.waitKey(0)
\ No newline at end of file
+from misc import metrics
+
+
+def skew_angle(gray):
+    """Degrees to rotate gray (counter-clockwise, as cv2.getRotationMatrix2D
+    takes them) to level its text, in [-45, 45)."""
+    # flip the foreground and background so the text is "white" and the
+    # background "black", then threshold it
+    thresh = cv2.threshold(cv2.bitwise_not(gray), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    coords = cv2.findNonZero(thresh)
+    if coords is None:
+        return 0.0
+    # minAreaRect's angle is ambiguous by 90 degrees (which side is the
+    # width), and its range differs between OpenCV versions; take the
+    # rotation nearest to level.
+    angle = cv2.minAreaRect(coords)[-1]
+    return (angle + 45) % 90 - 45
+
+
+def deskew(image):
+    """(rotated image, angle) with the text of image levelled."""
+    with metrics.timed('deskew'):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        angle = skew_angle(gray)
+        (h, w) = image.shape[:2]
+        M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+        rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    return rotated, angle
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-i", "--image", required=True, help="path to input image file")
+    args = vars(ap.parse_args())
+
+    image = cv2.imread(args["image"])
+    rotated, angle = deskew(image)
+
+    # draw the correction angle on the image so we can validate it
+    cv2.putText(rotated, "Angle: {:.2f} degrees".format(angle), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    print("[INFO] angle: {:.3f}".format(angle))
+    cv2.imshow("Input", image)
+    cv2.imshow("Rotated", rotated)
+    cv2.waitKey(0)
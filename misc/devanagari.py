@@ -0,0 +1,220 @@
+'''
+Route only the Devanagari lines of a card to Tesseract's Hindi model.
+
+Aadhaar and PAN cards print most labels twice, in Hindi and English.
+lang='eng+hin' over the whole card roughly doubles Tesseract time, and the
+Hindi model turns Latin text and noise into stray Devanagari. Devanagari is
+cheap to spot without OCR: letters hang from a headline (shirorekha) that
+runs unbroken across each word, so a text line whose top rows hold long
+horizontal runs of ink is Hindi, while Latin letters only give short runs
+(the bar of a T or E). A headline is a thin stroke with several vertical
+stems dropping from it to the baseline, which rules out text printed over
+a colour band, solid blobs, and Telugu, whose rounded letters can also
+carry a long top stroke but hang no stems from it.
+
+ocr_bilingual() finds the text lines, OCRs the page with the Devanagari
+lines blanked out in the primary language, then one pass of the Hindi model
+over just those lines pasted at their own coordinates, and merges the word
+boxes back into reading order:
+
+    result = devanagari.ocr(gray, lang='eng+hin')
+'''
+
+import cv2
+import numpy as np
+
+from misc import metrics
+from misc.box import words_to_text
+from misc.ocr import OcrResult, ocr_image
+
+SCRIPT_LANGS = ('hin', 'mar', 'san', 'nep')
+# Fraction of a word's width the headline runs have to cover.
+MIN_HEADLINE = 0.45
+# How much denser the headline row is than the median row below it.
+MIN_CONTRAST = 1.3
+MIN_LINE_HEIGHT = 8
+# Headline thickness as a fraction of the word height, and ink cover of
+# the word box: above these it is a bar or a blob, not a stroke.
+MAX_HEADLINE_THICKNESS = 0.25
+MAX_DENSITY = 0.6
+# Stems running from the headline down most of the way to the baseline,
+# and how many per word height of width.
+MIN_STEMS = 2
+STEMS_PER_HEIGHT = 0.8
+
+
+def line_rects(binary):
+    """(x, y, w, h) of the text lines in a white-on-black binary image:
+    characters joined horizontally, then one box per blob of line shape."""
+    h, w = binary.shape
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, w // 60), 1))
+    joined = cv2.dilate(binary, kernel)
+    # Components rather than external contours, so text inside a printed
+    # frame is not hidden behind the frame's outline.
+    stats = cv2.connectedComponentsWithStats(joined, connectivity=8)[2]
+    rects = [tuple(int(v) for v in s[:4]) for s in stats[1:]]
+    # Text never touches the edge of the image; scan borders and shadows do.
+    return [r for r in rects if MIN_LINE_HEIGHT <= r[3] <= h // 6 and r[2] >= 2 * r[3] and
+            r[0] > 0 and r[1] > 0 and r[0] + r[2] < w and r[1] + r[3] < h]
+
+
+def _runs(mask):
+    """(starts, ends) of the runs of True in a 1-d bool array."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+
+def is_devanagari(word):
+    """True when a white-on-black word crop has a shirorekha: a thin row (or
+    three, for slight skew) in its upper half whose long runs of ink span
+    the word, clearly denser than the letters hanging below it, with at
+    least MIN_STEMS stems dropping from it."""
+    h, w = word.shape
+    ink = word > 0
+    if ink.mean() > MAX_DENSITY:
+        return False
+    rows = ink.sum(axis=1)
+    peak = int(np.argmax(rows[:max(1, h // 2 + 1)]))
+    below = rows[peak + 2:]
+    below = below[below > 0]
+    if len(below) < h // 3 or rows[peak] < MIN_CONTRAST * np.median(below):
+        return False
+    starts, ends = _runs(rows >= 0.6 * rows[peak])
+    i = np.searchsorted(ends, peak, side='right')
+    top, bottom = starts[i], ends[i]
+    if bottom - top > max(2, MAX_HEADLINE_THICKNESS * h):
+        return False
+    band = ink[max(0, peak - 1):peak + 2].any(axis=0)
+    starts, ends = _runs(band)
+    runs = ends - starts
+    if runs[runs >= 0.8 * h].sum() < MIN_HEADLINE * w:
+        return False
+    # How far down each column stays inked from the headline's lower edge.
+    body = ink[bottom - 1:]
+    depth = np.where(body.all(axis=0), len(body), np.argmin(body, axis=0))
+    baseline = np.flatnonzero(rows)[-1] - bottom + 2
+    stems = len(_runs(depth >= 0.6 * baseline)[0])
+    return bool(stems >= max(MIN_STEMS, STEMS_PER_HEIGHT * w / h))
+
+
+def word_spans(line):
+    """(x1, x2) of each word in a white-on-black line crop, split where the
+    columns are blank for a quarter of the line height."""
+    h = line.shape[0]
+    spans = []
+    for x1, x2 in zip(*_runs(line.any(axis=0))):
+        if spans and x1 - spans[-1][1] < max(2, h // 4):
+            spans[-1][1] = x2
+        else:
+            spans.append([x1, x2])
+    return spans
+
+
+def binarize(gray):
+    """White-on-black text from a grayscale card. The card's background is
+    divided out first (a closing wider than any stroke), so one Otsu
+    threshold still keeps the thin headlines of small or light print."""
+    size = max(15, min(gray.shape) // 25) | 1
+    background = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size)))
+    flat = cv2.divide(gray, background, scale=255)
+    return cv2.threshold(flat, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+
+
+def devanagari_rects(gray):
+    """(x1, y1, x2, y2) of the Devanagari text in a grayscale image (dark
+    text on a light background): whole lines, or runs of Devanagari words in
+    lines that mix scripts ("नाम / Name"). Punctuation too narrow to judge
+    stays with the Devanagari before it."""
+    with metrics.timed('script'):
+        binary = binarize(gray)
+        rects = []
+        for x, y, w, h in line_rects(binary):
+            line = binary[y:y + h, x:x + w]
+            if is_devanagari(line):
+                rects.append((x, y, x + w, y + h))
+                continue
+            run = None
+            for x1, x2 in word_spans(line):
+                if x2 - x1 < 0.6 * h:
+                    if run is not None:
+                        run[1] = x2
+                    continue
+                if x2 - x1 >= 1.5 * h and is_devanagari(line[:, x1:x2]):
+                    run = [x1 if run is None else run[0], x2]
+                    continue
+                if run is not None:
+                    rects.append((x + run[0], y, x + run[1], y + h))
+                    run = None
+            if run is not None:
+                rects.append((x + run[0], y, x + run[1], y + h))
+    metrics.count('devanagari_lines', len(rects))
+    return rects
+
+
+def merge(results):
+    """One OcrResult from several passes over the same page: words are put
+    back into lines by vertical overlap, left to right within a line."""
+    words = np.concatenate([r.words for r in results])
+    boxes = np.concatenate([r.word_boxes for r in results])
+    if not len(words):
+        return OcrResult('', words, boxes)
+    centre = boxes['top'] + boxes['height'] / 2.0
+    order = np.argsort(centre, kind='stable')
+    line, line_ids = 0, np.zeros(len(words), dtype=np.int16)
+    bottom = None
+    for i in order:
+        if bottom is not None and centre[i] > bottom:
+            line += 1
+            bottom = None
+        line_ids[i] = line
+        # A line ends where its first word does, so a tall word cannot
+        # swallow the next line.
+        if bottom is None:
+            bottom = boxes['top'][i] + boxes['height'][i]
+    order = np.lexsort((boxes['left'], line_ids))
+    words, boxes = words[order], boxes[order]
+    boxes['page'], boxes['block'], boxes['par'] = 1, 1, 1
+    boxes['line'] = line_ids[order]
+    boxes['word'] = np.concatenate([np.arange(n) for n in np.bincount(boxes['line'])]) + 1
+    return OcrResult(words_to_text(words, boxes), words, boxes)
+
+
+def ocr_bilingual(gray, lang='eng', script_lang='hin', config=''):
+    """OCR gray in lang, except its Devanagari lines, which get script_lang.
+    A page with no Devanagari costs one lang pass, as ocr_image would."""
+    rects = devanagari_rects(gray)
+    if not rects:
+        return ocr_image(gray, lang=lang, config=config)
+    background = 255 if np.median(gray) > 127 else 0
+    latin = gray.copy()
+    for x1, y1, x2, y2 in rects:
+        latin[y1:y2, x1:x2] = background
+    # Only the area the Devanagari lines span goes to the second pass.
+    left, top = min(r[0] for r in rects), min(r[1] for r in rects)
+    right, bottom = max(r[2] for r in rects), max(r[3] for r in rects)
+    script = np.full((bottom - top, right - left), background, dtype=gray.dtype)
+    for x1, y1, x2, y2 in rects:
+        script[y1 - top:y2 - top, x1 - left:x2 - left] = gray[y1:y2, x1:x2]
+    first = ocr_image(latin, lang=lang, config=config)
+    second = ocr_image(script, lang=script_lang, config=config)
+    second.word_boxes['left'] += left
+    second.word_boxes['top'] += top
+    return merge([first, second])
+
+
+def split_lang(lang):
+    """('eng', 'hin') for 'eng+hin': the Tesseract languages for the Latin
+    text and for the Devanagari lines. Either may be empty."""
+    langs = lang.split('+')
+    return ('+'.join(l for l in langs if l not in SCRIPT_LANGS),
+            '+'.join(l for l in langs if l in SCRIPT_LANGS))
+
+
+def ocr(gray, lang='eng', config=''):
+    """ocr_image, except that a Devanagari language combined with another
+    ('eng+hin') is routed per line by ocr_bilingual instead of running both
+    models over the whole image."""
+    latin, script = split_lang(lang)
+    if not latin or not script:
+        return ocr_image(gray, lang=lang, config=config)
+    return ocr_bilingual(gray, latin, script, config)
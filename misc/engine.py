@@ -0,0 +1,445 @@
+'''
+Shared extraction pipeline behind the per-card scripts.
+
+    load -> preprocess -> OCR -> clean -> classify -> parse
+
+Each document type has a parser taking the cleaned OCR text and returning
+the same field dict its script writes to data.json. extract() runs the whole
+chain on an in-memory image so other stages (multi-card sheets, batch runs,
+the web app) can call an extractor without shelling out to a script.
+
+Usage:
+    python -m misc.engine -i card.jpg [-p thresh] [-t PAN] [-l eng+hin] [--orient] [--gate] [--warp] [--profile DIR]
+'''
+
+import argparse
+import json
+import re
+import unicodedata
+
+import cv2
+import ftfy
+
+from misc import aadhaar, devanagari, metrics, mrz, orientation, pan_number, quality, rectify
+from misc.profiling import PROFILER
+
+PREPROCESS_MODES = ('thresh', 'adaptive', 'linear', 'cubic', 'blur', 'bilateral', 'gauss')
+
+
+class Extraction(object):
+    """Fields extracted from one card, with the OCR result they came from.
+    rect is the (x1, y1, x2, y2) source rectangle when the card was cropped
+    out of a larger image. cached is set when the fields were reused from
+    the same earlier image, or a near-duplicate with the same numbers (see
+    misc/phash.py). quality holds
+    the misc/quality.py scores when the image went through the quality gate.
+    rotation is the clockwise turn misc/orientation.py gave the image."""
+    def __init__(self, doc_type, data, ocr=None, rect=None, cached=False, quality=None, rotation=0):
+        self.doc_type = doc_type
+        self.data = data
+        self.ocr = ocr
+        self.rect = rect
+        self.cached = cached
+        self.quality = quality
+        self.rotation = rotation
+
+    def to_dict(self):
+        out = {'Document Type': self.doc_type, 'Data': self.data}
+        if self.rect is not None:
+            out['Rect'] = [int(v) for v in self.rect]
+        if self.cached:
+            out['Cached'] = True
+        if self.quality is not None:
+            out['Quality'] = dict((k, round(v, 4)) for k, v in self.quality.items())
+        if self.rotation:
+            out['Rotation'] = self.rotation
+        return out
+
+    def __repr__(self):
+        return 'Extraction(%s, %s)' % (self.doc_type, self.data)
+
+
+def load_image(path):
+    with metrics.timed('decode'):
+        image = cv2.imread(path)
+    if image is None:
+        raise IOError('could not read image: %s' % path)
+    return image
+
+
+def to_gray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def preprocess(gray, mode='thresh'):
+    """Apply one of PREPROCESS_MODES to a grayscale image."""
+    if mode == "thresh":
+        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    elif mode == "adaptive":
+        gray = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+    elif mode == "linear":
+        gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+    elif mode == "cubic":
+        gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+    elif mode == "blur":
+        gray = cv2.medianBlur(gray, 3)
+    elif mode == "bilateral":
+        gray = cv2.bilateralFilter(gray, 9, 75, 75)
+    elif mode == "gauss":
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    return gray
+
+
+# Anything ftfy could change: ASCII control characters (other than tab, newline
+# and Tesseract's trailing form feed), \r, HTML entities, Latin-1/cp1252 code
+# points that mojibake is made of, general punctuation (curly quotes, zero-width
+# and bidi marks), letterlike symbols, the ideographic space, ligatures,
+# half/full-width forms, BOM and replacement characters, and astral-plane
+# characters.
+_NEEDS_FTFY = re.compile('[\x00-\x08\x0b\x0d-\x1f\x7f-\u02ff\u2000-\u206f\u20a0-\u214f'
+                         '\u3000\ufb00-\ufb4f\ufe00-\ufe0f\ufeff-\uffff\U00010000-\U0010ffff&]')
+
+
+def needs_cleanup(text):
+    """False when ftfy is known to leave text unchanged, e.g. plain ASCII."""
+    if _NEEDS_FTFY.search(text):
+        return True
+    return not text.isascii() and not unicodedata.is_normalized('NFC', text)
+
+
+def clean_text(text):
+    """Repair mojibake and other encoding damage in OCR output. Text that
+    cannot contain any skips ftfy's pure-Python heuristics entirely."""
+    if not needs_cleanup(text):
+        metrics.count('cleanup_skipped')
+        return text
+    metrics.count('cleanup_full')
+    text = ftfy.fix_text(text)
+    return ftfy.fix_encoding(text)
+
+
+def text_lines(text):
+    """Non-empty, stripped lines of text."""
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def classify_document(text):
+    if re.search(r"\d{4} \d{4} \d{4}", text) or aadhaar.decode(text)[0]:
+        return "Aadhaar"
+    elif re.search(r"[A-Z]{5}\d{4}[A-Z]", text):
+        return "PAN"
+    elif re.search(r"DRIVING|[A-Z]{2}[-\s]?\d{2}[-\s]?\d{11}", text):
+        return "Driving Licence"
+    elif re.search(r"[A-Z]\d{7}", text):
+        return "Passport"
+    else:
+        return "Unknown"
+
+
+################################################################################################################
+################################################### Aadhaar ####################################################
+################################################################################################################
+
+# Function to find the word matching a regular expression in a list of text
+def findword(text_lines, pattern):
+    for line in text_lines:
+        match = re.search(pattern, line, re.IGNORECASE)  # Added IGNORECASE to match case-insensitively
+        if match:
+            return match.group(0)  # Return the first match found
+    return None  # Return None if no match found
+
+
+# Function to validate and format Date of Birth
+def format_dob(dob):
+    # Check if it's in the correct dd/mm/yyyy or yyyy format
+    if re.match(r"^\d{2}/\d{2}/\d{4}$", dob):  # dd/mm/yyyy
+        return dob
+    elif re.match(r"^\d{4}$", dob):  # yyyy
+        return dob
+    else:
+        return None  # Return None if the format is incorrect
+
+
+def parse_aadhaar(text):
+    text1 = text_lines(text)
+
+    # Capture Year of Birth (ensure it's in correct format)
+    yob = findword(text1, r"\d{4}|\d{2}/\d{2}/\d{4}")  # Pattern for 4-digit year or dd/mm/yyyy format
+    if yob:
+        yob = format_dob(yob)
+
+    # Extract Gender (check for the presence of Male or Female)
+    gender = findword(text1, r"\b(Male|Female)\b")
+    if gender:
+        gender = gender.strip()
+
+    # Extract Aadhar Number (XXXX XXXX XXXX), checked and if need be repaired
+    # with its Verhoeff check digit instead of dropped
+    adhar, confidence = aadhaar.decode('\n'.join(text1))
+
+    return {
+        'Year of Birth': yob,
+        'Gender': gender,
+        'Aadhar': adhar,
+        'Aadhar Confidence': confidence
+    }
+
+
+################################################################################################################
+##################################################### PAN ######################################################
+################################################################################################################
+
+# Function to find and return data after a specific keyword
+def find_after_keyword(textlist, keyword):
+    for wordline in textlist:
+        if keyword.lower() in wordline.lower():
+            index = textlist.index(wordline) + 1
+            return textlist[index] if index < len(textlist) else None
+    return None
+
+
+def parse_pan(text):
+    text1 = text_lines(text)
+
+    name = find_after_keyword(text1, 'Name')
+    name = name.strip() if name else "Not found"
+
+    fname = find_after_keyword(text1, "Father's Name")
+    fname = fname.strip() if fname else "Not found"
+
+    dob = find_after_keyword(text1, 'Date of Birth')
+    if dob:
+        dob = re.sub('[^0-9/]', '', dob.strip())  # Ensuring only valid date characters
+
+    # Decode the PAN position by position, from the line under its label if
+    # there is one, else from anywhere on the card
+    panline = find_after_keyword(text1, 'Permanent Account Number')
+    pan, confidence = pan_number.decode(panline) if panline else (None, None)
+    if pan is None:
+        pan, confidence = pan_number.decode('\n'.join(text1))
+
+    return {
+        'Name': name,
+        'Father Name': fname,
+        'Date of Birth': dob,
+        'PAN': pan or "Not found",
+        'PAN Confidence': confidence
+    }
+
+
+################################################################################################################
+################################################### Passport ###################################################
+################################################################################################################
+
+def _passport_gender(text, lines):
+    """M/F/X from the sex position of an MRZ-looking line (even if its check
+    digits fail), else the lone M, F or X after the "Sex" label."""
+    mrz_pair = mrz.mrz_lines(text)
+    if mrz_pair and mrz_pair[1][20] in 'MFX':
+        return mrz_pair[1][20]
+    for i, line in enumerate(lines):
+        at = line.lower().find('sex')
+        if at < 0:
+            continue
+        for candidate in (line[at + 3:], lines[i + 1] if i + 1 < len(lines) else ''):
+            m = re.search(r'(?:^|[\s/:])([MFX])(?:$|[\s/])', candidate.strip())
+            if m:
+                return m.group(1)
+    return None
+
+
+def parse_passport(text):
+    """Fields from a passport data page. The MRZ is used when the OCR text
+    holds one whose check digits hold; otherwise fields are taken by line
+    position."""
+    data = mrz.parse_mrz_text(text)
+    if data is not None:
+        return data
+    text0 = text_lines(text)[1:]
+    surname = first_name = dob = number = doe = None
+    gender = _passport_gender(text, text0)
+    try:
+        surname = re.sub('[^a-zA-Z]+', ' ', text0[3].strip())
+        first_name = re.sub('[^a-zA-Z]+', ' ', text0[5].strip())
+        dob = re.sub('[^0-9/]+', '', text0[7].strip())
+        number = text0[1].strip()[-8:]  # Assuming passport number is at the start of the line
+        doe = re.sub('[^0-9/]+', '', text0[14].strip())
+    except IndexError:
+        pass
+
+    return {
+        'Surname': surname,
+        'First Name': first_name,
+        'Date of Birth': dob,
+        'Gender': gender,
+        'Number': number,
+        'Date of Expiry': doe,
+        'Nationality': None
+    }
+
+
+################################################################################################################
+############################################### Driving Licence ################################################
+################################################################################################################
+
+def parse_driving_licence(text):
+    text0 = text_lines(text)[1:]
+    name = dob = number = doe = None
+    try:
+        name = re.sub('[^a-zA-Z]+', ' ', text0[5]).strip()
+        dob = text0[4].strip()[4:7]
+        number = text0[1][-21:-6].strip()
+        doe = text0[14].strip()[-12:-2]
+    except IndexError:
+        pass
+
+    return {
+        'Name': name,
+        'Date of Birth': dob,
+        'Number': number,
+        'Date of Expiry': doe
+    }
+
+
+PARSERS = {
+    'Aadhaar': parse_aadhaar,
+    'PAN': parse_pan,
+    'Passport': parse_passport,
+    'Driving Licence': parse_driving_licence,
+}
+
+
+def _number_words(words):
+    """The words holding two or more digits (ID numbers, dates), upper-cased
+    alphanumerics only."""
+    words = [re.sub(r'\W+', '', w).upper() for w in words]
+    return [w for w in words if sum(c.isdigit() for c in w) >= 2]
+
+
+def same_numbers(gray, ocr, shape, pad=4):
+    """True when the number words of an earlier card's OCR (ocr, read from a
+    gray image of the given shape) read the same in the region they span
+    of this gray image. A near-duplicate perceptual hash cannot tell two
+    holders' cards on one template apart; their numbers can."""
+    if ocr is None or shape is None:
+        return False
+    expected = _number_words(ocr.words)
+    if not expected:
+        return False
+    b = ocr.word_boxes[[i for i, w in enumerate(ocr.words) if _number_words([w])]]
+    fy, fx = gray.shape[0] / float(shape[0]), gray.shape[1] / float(shape[1])
+    x1, y1 = int(max(0, b['left'].min() - pad) * fx), int(max(0, b['top'].min() - pad) * fy)
+    x2, y2 = int(((b['left'] + b['width']).max() + pad) * fx), int(((b['top'] + b['height']).max() + pad) * fy)
+    crop = gray[y1:y2, x1:x2]
+    return crop.size > 0 and _number_words(devanagari.ocr(crop).words) == expected
+
+
+def extract(image, doc_type=None, mode='thresh', lang='eng', cache=None, gate=False, orient=False,
+            warp=False):
+    """Run the full pipeline on a BGR or grayscale image.
+    doc_type picks the parser; when None it is classified from the text.
+    cache is an optional phash.HashCache: the same image seen before returns
+    its fields without OCR, and so does a near-duplicate once its number
+    words, OCR'd again from the region they span, read the same.
+    gate=True scores the image first (misc/quality.py) and raises
+    quality.QualityError for one not worth OCR; a low-resolution but usable
+    image is upscaled with 'cubic' preprocessing instead, unless it is warped.
+    warp=True then perspective-corrects the card onto the fixed
+    rectify.CARD_SIZE raster (misc/rectify.py); passports are left as they
+    are, as is an image that is neither a card outline nor card-shaped.
+    orient=True first turns a sideways or upside-down image the right way
+    up (misc/orientation.py), so every later stage sees it upright.
+    Unless doc_type names another card, a passport MRZ is tried first
+    (misc/mrz.py); when its check digits hold, the page is never fully OCR'd.
+    lang='eng+hin' reads Hindi too, giving only the Devanagari lines to
+    the hin model (misc/devanagari.py).
+    Returns an Extraction."""
+    rotation = 0
+    if orient:
+        image, rotation = orientation.upright(image)
+    scores = None
+    if gate:
+        reason, scores = quality.check(image)
+        if reason:
+            raise quality.QualityError(reason, scores)
+    card = None
+    if warp and doc_type != 'Passport':
+        card = rectify.rectify(image)
+        if card is not None:
+            image = card
+    # The warp already brings a card to 300 DPI; only an unwarped image is
+    # upscaled.
+    if gate and card is None and scores['dpi'] < quality.UPSCALE_DPI and mode not in ('linear', 'cubic'):
+        metrics.count('upscaled')
+        mode = 'cubic'
+    if cache is not None:
+        with metrics.timed('hash'):
+            key = cache.key(image)
+            entry, exact = cache.get(key)
+        hit, shape = entry or (None, None)
+        if hit is not None and doc_type in (None, hit.doc_type):
+            if not exact:
+                with metrics.timed('ocr'):
+                    exact = same_numbers(preprocess(to_gray(image), mode), hit.ocr, shape)
+                if not exact:
+                    metrics.count('cache_unconfirmed')
+            if exact:
+                metrics.count('cache_hits')
+                return Extraction(hit.doc_type, dict(hit.data), hit.ocr, cached=True, quality=scores,
+                                  rotation=rotation)
+        metrics.count('cache_misses')
+    data = mrz.read_mrz(image, devanagari.split_lang(lang)[0] or lang) if doc_type in (None, 'Passport') else None
+    if data is not None:
+        record = Extraction('Passport', data, quality=scores, rotation=rotation)
+    else:
+        with metrics.timed('preprocess'):
+            gray = preprocess(to_gray(image), mode)
+        with metrics.timed('ocr'):
+            result = devanagari.ocr(gray, lang=lang)
+        with metrics.timed('parse'):
+            text = clean_text(result.text)
+            if doc_type is None:
+                doc_type = classify_document(text)
+            parser = PARSERS.get(doc_type)
+            data = parser(text) if parser else {}
+        if doc_type == 'PAN' and data.get('PAN Confidence') != 'valid' and result.words is not None:
+            with metrics.timed('ocr'):
+                pan, confidence = pan_number.reread(gray, result)
+            if pan is not None:
+                data['PAN'], data['PAN Confidence'] = pan, confidence
+        record = Extraction(doc_type, data, result, quality=scores, rotation=rotation)
+    metrics.count('documents')
+    if cache is not None:
+        cache.put(key, (record, None if record.ocr is None else gray.shape[:2]))
+    return record
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-i", "--image", required=True, help="path to input image to be OCR'd")
+    ap.add_argument("-p", "--preprocess", type=str, default="thresh", choices=PREPROCESS_MODES,
+                    help="type of preprocessing to be done")
+    ap.add_argument("-t", "--type", choices=sorted(PARSERS), help="document type (default: classify from the text)")
+    ap.add_argument("-l", "--lang", default="eng", help="Tesseract language(s); eng+hin reads the Devanagari lines with hin")
+    ap.add_argument("--orient", action="store_true", help="turn sideways or upside-down images the right way up first")
+    ap.add_argument("--gate", action="store_true", help="reject blurry, glared, flat or low-resolution images before OCR")
+    ap.add_argument("--warp", action="store_true", help="perspective-correct the card to a flat 1011x638 raster")
+    ap.add_argument("--profile", metavar="DIR", help="profile the run and write reports to DIR")
+    args = ap.parse_args()
+
+    image = load_image(args.image)
+    try:
+        if args.profile:
+            with PROFILER.profile():
+                record = extract(image, doc_type=args.type, mode=args.preprocess, lang=args.lang, gate=args.gate,
+                                 orient=args.orient, warp=args.warp)
+            PROFILER.write(args.profile)
+        else:
+            record = extract(image, doc_type=args.type, mode=args.preprocess, lang=args.lang, gate=args.gate,
+                             orient=args.orient, warp=args.warp)
+        out = record.to_dict()
+    except quality.QualityError as e:
+        out = e.to_dict()
+    print(json.dumps(out, ensure_ascii=False, indent=4))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+'''Extract a card from a video clip or a burst of stills.
+Usage:
+    python -m misc.frames clip.mp4 [-n 2] [--step 1] [-p thresh] [-t PAN]
+    python -m misc.frames shot1.jpg shot2.jpg shot3.jpg
+Every frame is scored on a small grayscale thumbnail (misc/quality.py:
+sharpness, glare, card coverage). Only the best n frames go through
+preprocessing and OCR, and the one whose parser found the most fields is
+printed, with the frame index and its scores.
+'''
+
+import argparse
+import heapq
+import json
+import os
+
+import cv2
+
+from misc import engine, metrics, quality
+from misc.common import image_extensions
+
+
+def read_video(path, step=1):
+    """Yield (index, frame) for every step-th frame of a video file.
+    Skipped frames are grabbed but never converted to BGR."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError('could not open video: %s' % path)
+    try:
+        index = 0
+        while cap.grab():
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def read_burst(paths):
+    for index, path in enumerate(paths):
+        yield index, engine.load_image(path)
+
+
+def best_frames(frames, n=2):
+    """Score each (index, frame) and keep the n best, best first, as
+    (scores, index, frame). Only n frames are held in memory."""
+    best = []
+    for index, frame in frames:
+        with metrics.timed('score'):
+            scores = quality.frame_scores(frame)
+        metrics.count('frames')
+        item = (scores['score'], -index, scores, frame)
+        if len(best) < n:
+            heapq.heappush(best, item)
+        elif item[:2] > best[0][:2]:
+            heapq.heapreplace(best, item)
+    best.sort(key=lambda item: item[:2], reverse=True)
+    return [(scores, -neg_index, frame) for _, neg_index, scores, frame in best]
+
+
+def _found(record):
+    return sum(1 for v in record.data.values() if v not in (None, '', 'Not found'))
+
+
+def extract_best(frames, n=2, doc_type=None, mode='thresh', lang='eng'):
+    """OCR the n best frames and return (record, index, scores) for the one
+    whose parser filled the most fields; ties go to the sharper frame."""
+    result = None
+    for scores, index, frame in best_frames(frames, n):
+        record = engine.extract(frame, doc_type=doc_type, mode=mode, lang=lang)
+        if result is None or _found(record) > _found(result[0]):
+            result = (record, index, scores)
+    return result
+
+
+def open_frames(paths, step=1):
+    if len(paths) == 1 and os.path.splitext(paths[0])[1].lower() not in image_extensions:
+        return read_video(paths[0], step)
+    return read_burst(paths[::step])
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('inputs', nargs='+', help='one video file, or several stills of the same card')
+    ap.add_argument('-n', '--frames', type=int, default=2, help='how many of the best frames to OCR')
+    ap.add_argument('--step', type=int, default=1, help='only score every step-th frame')
+    ap.add_argument("-p", "--preprocess", type=str, default="thresh", choices=engine.PREPROCESS_MODES,
+                    help="type of preprocessing to be done")
+    ap.add_argument("-t", "--type", choices=sorted(engine.PARSERS), help="document type (default: classify from the text)")
+    args = ap.parse_args()
+
+    best = extract_best(open_frames(args.inputs, args.step), args.frames, args.type, args.preprocess)
+    if best is None:
+        raise SystemExit('no frames read from %s' % ' '.join(args.inputs))
+    record, index, scores = best
+    out = record.to_dict()
+    out['Frame'] = index
+    out['Scores'] = {k: round(v, 4) for k, v in scores.items()}
+    print(json.dumps(out, ensure_ascii=False, indent=4))
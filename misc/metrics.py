@@ -0,0 +1,197 @@
+'''
+Per-stage timings and counters for the extraction pipeline.
+
+Stages (decode, preprocess, crop, deskew, ocr, parse, ...) are timed with
+common.Timer and kept as cumulative histograms plus an exponentially
+smoothed recent value (common.StatValue). The registry renders
+as Prometheus text for the web app's /metrics and as a JSON summary for the
+end of a batch run. Worker processes drain() their registry and the parent
+merge()s it, so a process pool still reports one set of numbers.
+
+    with metrics.timed('ocr'):
+        result = ocr_image(gray)
+    metrics.count('cache_hits')
+'''
+
+import os
+import threading
+from contextlib import contextmanager
+
+from misc.common import StatValue, Timer
+
+PREFIX = 'dococr'
+# Thread ident -> innermost stage currently being timed on that thread.
+# Read by the sampling profiler to label stacks.
+ACTIVE_STAGES = {}
+# Upper bounds in seconds; Tesseract on a full card is usually 0.3-3 s.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = StatValue(smooth_coef=0.9)
+
+    def observe(self, v):
+        i = 0
+        while i < len(self.buckets) and v > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += v
+        self.count += 1
+        self.recent.update(v)
+
+    def state(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'sum': self.sum,
+                'count': self.count, 'recent': self.recent.value}
+
+    def merge(self, state):
+        self.counts = [a + b for a, b in zip(self.counts, state['counts'])]
+        self.sum += state['sum']
+        self.count += state['count']
+        if state['recent'] is not None:
+            self.recent.update(state['recent'])
+
+
+class Registry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.scores = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(seconds)
+
+    def score(self, name, value, buckets):
+        """Record a unitless per-image score (e.g. quality sharpness)."""
+        with self.lock:
+            if name not in self.scores:
+                self.scores[name] = Histogram(buckets)
+            self.scores[name].observe(value)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timed(self, stage):
+        ident = threading.get_ident()
+        outer = ACTIVE_STAGES.get(ident)
+        ACTIVE_STAGES[ident] = stage
+        try:
+            with Timer(stage, record=lambda seconds: self.observe(stage, seconds)):
+                yield
+        finally:
+            if outer is None:
+                ACTIVE_STAGES.pop(ident, None)
+            else:
+                ACTIVE_STAGES[ident] = outer
+
+    def drain(self):
+        """Return the raw state and reset, for shipping to another process."""
+        with self.lock:
+            state = {'histograms': dict((k, h.state()) for k, h in self.histograms.items()),
+                     'scores': dict((k, h.state()) for k, h in self.scores.items()),
+                     'counters': dict(self.counters), 'gauges': dict(self.gauges)}
+            self.histograms, self.scores, self.counters, self.gauges = {}, {}, {}, {}
+        return state
+
+    def merge(self, state):
+        with self.lock:
+            for stage, h in state['histograms'].items():
+                if stage not in self.histograms:
+                    self.histograms[stage] = Histogram()
+                self.histograms[stage].merge(h)
+            for name, h in state.get('scores', {}).items():
+                if name not in self.scores:
+                    self.scores[name] = Histogram(h['buckets'])
+                self.scores[name].merge(h)
+            for name, n in state['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.gauges.update(state['gauges'])
+
+    def summary(self):
+        """JSON-friendly per-stage totals and means in milliseconds."""
+        with self.lock:
+            stages = {}
+            for stage, h in sorted(self.histograms.items()):
+                stages[stage] = {
+                    'count': h.count,
+                    'total_ms': round(h.sum * 1000, 2),
+                    'mean_ms': round(h.sum * 1000 / h.count, 2) if h.count else 0.0,
+                    'recent_ms': round(h.recent.value * 1000, 2) if h.recent.value is not None else None,
+                }
+            scores = {}
+            for name, h in sorted(self.scores.items()):
+                scores[name] = {'count': h.count, 'mean': round(h.sum / h.count, 4) if h.count else 0.0}
+            return {'stages': stages, 'scores': scores, 'counters': dict(sorted(self.counters.items())),
+                    'gauges': dict(sorted(self.gauges.items()))}
+
+    def to_prometheus(self):
+        """Render in the Prometheus text exposition format (version 0.0.4)."""
+        name = '%s_stage_seconds' % PREFIX
+        lines = ['# HELP %s Time spent in each pipeline stage.' % name,
+                 '# TYPE %s histogram' % name]
+        with self.lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ['+Inf'], h.counts):
+                    cumulative += n
+                    lines.append('%s_bucket{stage="%s",le="%s"} %d' % (name, stage, bound, cumulative))
+                lines.append('%s_sum{stage="%s"} %f' % (name, stage, h.sum))
+                lines.append('%s_count{stage="%s"} %d' % (name, stage, h.count))
+            recent = '%s_stage_recent_seconds' % PREFIX
+            lines.append('# HELP %s Exponentially smoothed recent stage time.' % recent)
+            lines.append('# TYPE %s gauge' % recent)
+            for stage, h in sorted(self.histograms.items()):
+                if h.recent.value is not None:
+                    lines.append('%s{stage="%s"} %f' % (recent, stage, h.recent.value))
+            if self.scores:
+                score = '%s_score' % PREFIX
+                lines.append('# HELP %s Per-image scores (image quality).' % score)
+                lines.append('# TYPE %s histogram' % score)
+            for label, h in sorted(self.scores.items()):
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ['+Inf'], h.counts):
+                    cumulative += n
+                    lines.append('%s_bucket{score="%s",le="%s"} %d' % (score, label, bound, cumulative))
+                lines.append('%s_sum{score="%s"} %f' % (score, label, h.sum))
+                lines.append('%s_count{score="%s"} %d' % (score, label, h.count))
+            for counter, n in sorted(self.counters.items()):
+                lines.append('# TYPE %s_%s_total counter' % (PREFIX, counter))
+                lines.append('%s_%s_total %d' % (PREFIX, counter, n))
+            for gauge, v in sorted(self.gauges.items()):
+                lines.append('# TYPE %s_%s gauge' % (PREFIX, gauge))
+                lines.append('%s_%s %s' % (PREFIX, gauge, v))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _reset_after_fork():
+    # A forked worker inherits the parent's in-progress stages and totals;
+    # start clean so drain() only ships what the worker itself measured.
+    ACTIVE_STAGES.clear()
+    REGISTRY.lock = threading.Lock()
+    REGISTRY.drain()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+timed = REGISTRY.timed
+score = REGISTRY.score
+count = REGISTRY.count
+set_gauge = REGISTRY.set_gauge
@@ -5,7 +5,7 @@ Used to Morph Images, migrated from Python 2 to Python 3
 
 Morphology operations.
 Usage:
-  crop_morphology_p3.py [<image>]
+  morph_interactive.py [<image>]
 Keys:
   1   - change operation
   2   - change structure element shape
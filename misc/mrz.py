@@ -0,0 +1,176 @@
+'''
+Passport machine-readable zone (ICAO 9303 TD3: two lines of 44 characters).
+
+Every field parse_passport() digs out of the full page by line position is
+also in the MRZ, with check digits. read_mrz() finds the two lines near the
+bottom of the page with morphology, OCRs only that band with a whitelist
+of the OCR-B alphabet (A-Z, 0-9, <), and validates the check digits,
+repairing common OCR confusions (O/0, I/1, B/8, ...) only where that makes
+a check digit pass. The full-page path is only needed when this fails.
+
+    data = mrz.read_mrz(image)
+    if data is None:
+        ...  # OCR the whole page
+'''
+
+import datetime
+import re
+
+import cv2
+import numpy as np
+
+from misc import metrics
+from misc.ocr import ocr_image
+
+LINE_LENGTH = 44
+WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<'
+OCR_CONFIG = '--psm 6 -c tessedit_char_whitelist=%s' % WHITELIST
+# Characters OCR mixes up in OCR-B, letter -> digit and back.
+TO_DIGIT = {'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5',
+            'G': '6', 'B': '8', 'T': '7'}
+TO_LETTER = dict((d, l) for l, d in (('O', '0'), ('I', '1'), ('Z', '2'), ('S', '5'),
+                                     ('G', '6'), ('B', '8')))
+_MRZ_LINE = re.compile(r'[A-Z0-9<]{30,}')
+
+
+def check_digit(field):
+    """ICAO 9303 check digit: weights 7, 3, 1 over 0-9, A=10 .. Z=35, <=0."""
+    total = 0
+    for i, c in enumerate(field):
+        if c.isdigit():
+            v = ord(c) - 48
+        elif 'A' <= c <= 'Z':
+            v = ord(c) - 55
+        else:
+            v = 0
+        total += v * (7, 3, 1)[i % 3]
+    return str(total % 10)
+
+
+def find_mrz(gray):
+    """Bounding rect (x1, y1, x2, y2) of the MRZ band in a grayscale page,
+    or None. Looks only at the bottom half, where TD3 puts it."""
+    h, w = gray.shape
+    top = h // 2
+    scale = min(1.0, 800.0 / w)
+    small = cv2.resize(gray[top:], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    # Dark text on light paper -> bright strokes, then join the characters of
+    # each line and the two lines into one wide block.
+    blackhat = cv2.morphologyEx(small, cv2.MORPH_BLACKHAT, cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5)))
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad = cv2.normalize(grad, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (21, 5)))
+    mask = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (27, 21)))
+    mask = cv2.erode(mask, None, iterations=2)
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+    sw = small.shape[1]
+    lines = [cv2.boundingRect(c) for c in contours]
+    lines = [r for r in lines if r[2] > 0.6 * sw and r[2] > 5 * r[3]]
+    if not lines:
+        return None
+    # The lowest wide block is the last MRZ line; take in the line(s) just
+    # above it in case the two didn't merge.
+    lines.sort(key=lambda r: r[1])
+    x, y, bw, bh = lines[-1]
+    for lx, ly, lw, lh in reversed(lines[:-1]):
+        if y - (ly + lh) > 3 * lh:
+            break
+        x2, y2 = max(x + bw, lx + lw), y + bh
+        x, y = min(x, lx), ly
+        bw, bh = x2 - x, y2 - y
+    best = (x, y, bw, bh)
+    x, y, bw, bh = [v / scale for v in best]
+    pad_x, pad_y = 0.03 * bw, 0.25 * bh
+    return (int(max(0, x - pad_x)), int(max(0, top + y - pad_y)),
+            int(min(w - 1, x + bw + pad_x)), int(min(h - 1, top + y + bh + pad_y)))
+
+
+def mrz_lines(text):
+    """The last two TD3-looking lines of OCR text, padded or cut to 44."""
+    lines = [re.sub(r'\s+', '', l).upper() for l in text.splitlines()]
+    lines = [l for l in lines if '<' in l and _MRZ_LINE.search(l)]
+    if len(lines) < 2:
+        return None
+    return [(l + '<' * LINE_LENGTH)[:LINE_LENGTH] for l in lines[-2:]]
+
+
+def _repair(field, check, alphabet):
+    """Return field (with its check digit) if it validates, trying
+    single-character confusion fixes if it doesn't. None if nothing does."""
+    check = TO_DIGIT.get(check, check)
+    if check_digit(field) == check:
+        return field
+    for i, c in enumerate(field):
+        alt = alphabet.get(c)
+        if alt:
+            fixed = field[:i] + alt + field[i + 1:]
+            if check_digit(fixed) == check:
+                return fixed
+    return None
+
+
+def _date(yymmdd, future):
+    """YYMMDD -> DD/MM/YYYY. Birth dates are in the past; expiry dates may
+    be up to 50 years ahead."""
+    year = int(yymmdd[:2])
+    this_year = datetime.date.today().year % 100
+    century = 2000 if (year <= this_year + (50 if future else 0)) else 1900
+    return '%s/%s/%d' % (yymmdd[4:6], yymmdd[2:4], century + year)
+
+
+def parse_td3(line1, line2):
+    """Fields from two MRZ lines, in parse_passport()'s keys, or None if the
+    check digits don't hold (after confusion repair)."""
+    digits = lambda s: ''.join(TO_DIGIT.get(c, c) for c in s)
+    number = _repair(line2[0:9], line2[9], dict(TO_DIGIT, **TO_LETTER))
+    dob = _repair(digits(line2[13:19]), line2[19], {})
+    doe = _repair(digits(line2[21:27]), line2[27], {})
+    if number is None or dob is None or doe is None or not dob.isdigit() or not doe.isdigit():
+        return None
+    checks = [TO_DIGIT.get(line2[i], line2[i]) for i in (9, 19, 27, 42, 43)]
+    composite = number + checks[0] + dob + checks[1] + doe + checks[2] + line2[28:42] + checks[3]
+    if checks[4] != check_digit(composite):
+        return None
+
+    names = line1[5:].rstrip('<')
+    surname, _, given = names.partition('<<')
+    name = lambda s: ''.join(TO_LETTER.get(c, c) for c in s).replace('<', ' ').strip()
+    sex = line2[20]
+    return {
+        'Surname': name(surname),
+        'First Name': name(given),
+        'Date of Birth': _date(dob, future=False),
+        'Gender': sex if sex in ('M', 'F', 'X') else None,
+        'Number': number.rstrip('<'),
+        'Date of Expiry': _date(doe, future=True),
+        'Nationality': name(line2[10:13]),
+    }
+
+
+def parse_mrz_text(text):
+    """parse_td3() on the MRZ lines found in OCR text, or None."""
+    lines = mrz_lines(text)
+    return parse_td3(*lines) if lines else None
+
+
+def read_mrz(image, lang='eng'):
+    """Find, OCR and validate the MRZ of a passport page (BGR or gray).
+    Returns the field dict, or None to fall back to full-page OCR."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    with metrics.timed('mrz'):
+        rect = find_mrz(gray)
+        if rect is None:
+            metrics.count('mrz_missing')
+            return None
+        x1, y1, x2, y2 = rect
+        band = gray[y1:y2 + 1, x1:x2 + 1]
+        # OCR-B at 44 characters wants roughly 20 px per character.
+        if band.shape[1] < 900:
+            band = cv2.resize(band, None, fx=900.0 / band.shape[1], fy=900.0 / band.shape[1],
+                              interpolation=cv2.INTER_CUBIC)
+        band = cv2.threshold(band, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+        data = parse_mrz_text(ocr_image(band, lang=lang, config=OCR_CONFIG).text)
+    metrics.count('mrz_valid' if data else 'mrz_invalid')
+    return data
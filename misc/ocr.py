@@ -0,0 +1,54 @@
+'''
+Tesseract wrapper that keeps word geometry and confidences with the text.
+
+image_to_string throws away everything but the characters. ocr_image runs
+image_to_data instead, so one Tesseract pass yields the text plus a
+WORD_DTYPE array of word boxes, and optionally char boxes as well.
+'''
+
+import numpy as np
+import pytesseract
+
+from misc.box import parse_box_text, parse_tsv, words_to_text
+
+
+class OcrResult(object):
+    def __init__(self, text, words, word_boxes, letters=None, char_boxes=None):
+        self.text = text
+        self.words = words
+        self.word_boxes = word_boxes
+        self.letters = letters
+        self.char_boxes = char_boxes
+
+    def words_in(self, rect):
+        """Indices of the words whose box lies inside (x1, y1, x2, y2)."""
+        x1, y1, x2, y2 = rect
+        b = self.word_boxes
+        mask = ((b['left'] >= x1) & (b['top'] >= y1) &
+                (b['left'] + b['width'] <= x2) & (b['top'] + b['height'] <= y2))
+        return np.flatnonzero(mask)
+
+    def find(self, pattern):
+        """Indices of the words matching a compiled regular expression."""
+        return np.array([i for i, w in enumerate(self.words) if pattern.search(w)], dtype=np.intp)
+
+    def mean_conf(self):
+        conf = self.word_boxes['conf']
+        conf = conf[conf >= 0]
+        return float(conf.mean()) if len(conf) else -1.0
+
+    def __repr__(self):
+        return 'OcrResult(%d words, conf=%.1f)' % (len(self.words), self.mean_conf())
+
+
+def ocr_image(image, lang='eng', config='', chars=False):
+    """OCR a numpy or PIL image. Returns an OcrResult.
+    chars=True runs a second Tesseract pass for per-character boxes.
+    """
+    tsv = pytesseract.image_to_data(image, lang=lang, config=config)
+    words, word_boxes = parse_tsv(tsv)
+    result = OcrResult(words_to_text(words, word_boxes), words, word_boxes)
+    if chars:
+        boxes = pytesseract.image_to_boxes(image, lang=lang, config=config)
+        result.letters, result.char_boxes = parse_box_text(boxes)
+    return result
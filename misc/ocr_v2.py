@@ -1,13 +1,13 @@
 # import the necessary packages
-from PIL import Image
-import pytesseract
 import argparse
 import cv2
 import os
 import re
-import io
-import json
-import ftfy
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from misc import engine, pan_number
+from misc.ocr import ocr_image
+from misc.sinks import open_sink
 # from nostril import nonsense
 
 
@@ -21,6 +21,9 @@ ap.add_argument("-i", "--image", required=True,
                 help="path to input image to be OCR'd")
 ap.add_argument("-p", "--preprocess", type=str, default="thresh",
                 help="type of preprocessing to be done, choose from blur, linear, cubic or bilateral")
+ap.add_argument("-o", "--output", default="-",
+                help="where to write the record: - (stdout), *.jsonl, *.db or a directory/")
+ap.add_argument("-r", "--raw", help="also write the raw OCR text to this file")
 args = vars(ap.parse_args())
 
 '''
@@ -105,21 +108,13 @@ elif args["preprocess"] == "bilateral":
 elif args["preprocess"] == "gauss":
     gray = cv2.GaussianBlur(gray, (5,5), 0)
 
-# write the grayscale image to disk as a temporary file so we can
-# apply OCR to it
-filename = "{}.png".format(os.getpid())
-cv2.imwrite(filename, gray)
-
 '''
 A blurring method may be applied. We apply a median blur when the --preprocess flag is set to blur. 
 Applying a median blur can help reduce salt and pepper noise, again making it easier for Tesseract 
 to correctly OCR the image.
 
-After pre-processing the image, we use  os.getpid to derive a temporary image filename based on the process ID 
-of our Python script.
-
-The final step before using pytesseract for OCR is to write the pre-processed image, gray, 
-to disk saving it with the filename  from above
+After pre-processing the image, the array is handed straight to Tesseract, which returns word boxes and
+confidences along with the text.
 '''
 
 ##############################################################################################################
@@ -127,11 +122,10 @@ to disk saving it with the filename  from above
 ##############################################################################################################
 
 
-# load the image as a PIL/Pillow image, apply OCR, and then delete
-# the temporary file
-text = pytesseract.image_to_string(Image.open(filename), lang = 'eng')
+# apply OCR, keeping word boxes and confidences alongside the text
+result = ocr_image(gray, lang = 'eng')
 # add +hin after eng within the same argument to extract hindi specific text - change encoding to utf-8 while writing
-os.remove(filename)
+text = result.text
 # print(text)
 
 # show the output images
@@ -139,18 +133,13 @@ os.remove(filename)
 # cv2.imshow("Output", gray)
 # cv2.waitKey(0)
 
-# writing extracted data into a text file
-text_output = open('outputbase.txt', 'w', encoding='utf-8')
-text_output.write(text)
-text_output.close()
-
-file = open('outputbase.txt', 'r', encoding='utf-8')
-text = file.read()
-# print(text)
+# writing the raw OCR text into a text file if asked to
+if args["raw"]:
+    with open(args["raw"], 'w', encoding='utf-8') as text_output:
+        text_output.write(text)
 
-# Cleaning all the gibberish text
-text = ftfy.fix_text(text)
-text = ftfy.fix_encoding(text)
+# Cleaning all the gibberish text (ftfy, skipped for text it can't change)
+text = engine.clean_text(text)
 '''for god_damn in text:
     if nonsense(god_damn):
         text.remove(god_damn)
@@ -167,6 +156,7 @@ name = None
 fname = None
 dob = None
 pan = None
+pan_confidence = None
 nameline = []
 dobline = []
 panline = []
@@ -233,26 +223,11 @@ def findword(textlist, wordstring):
 
 try:
 
-    # Cleaning first names, better accuracy
-    name = text0[0]
-    name = name.rstrip()
-    name = name.lstrip()
-    name = name.replace("8", "B")
-    name = name.replace("0", "D")
-    name = name.replace("6", "G")
-    name = name.replace("1", "I")
-    name = re.sub('[^a-zA-Z] +', ' ', name)
+    # Cleaning first names: names hold no digits, so digit look-alikes become letters
+    name = pan_number.clean_name(text0[0])
 
     # Cleaning Father's name
-    fname = text0[1]
-    fname = fname.rstrip()
-    fname = fname.lstrip()
-    fname = fname.replace("8", "S")
-    fname = fname.replace("0", "O")
-    fname = fname.replace("6", "G")
-    fname = fname.replace("1", "I")
-    fname = fname.replace("\"", "A")
-    fname = re.sub('[^a-zA-Z] +', ' ', fname)
+    fname = pan_number.clean_name(text0[1])
 
     # Cleaning DOB
     dob = text0[2]
@@ -266,61 +241,44 @@ try:
     dob = dob.replace('\"', '/1')
     dob = dob.replace(" ", "")
 
-    # Cleaning PAN Card details
+    # Cleaning PAN Card details: decode against the AAAAA9999A layout, letter and digit
+    # positions each with their own confusion map
     text0 = findword(text1, '(Pormanam|Number|umber|Account|ccount|count|Permanent|ermanent|manent|wumm)$')
-    panline = text0[0]
-    pan = panline.rstrip()
-    pan = pan.lstrip()
-    pan = pan.replace(" ", "")
-    pan = pan.replace("\"", "")
-    pan = pan.replace(";", "")
-    pan = pan.replace("%", "L")
+    pan, pan_confidence = pan_number.decode(text0[0])
 
 except:
     pass
 
+# Not a valid PAN from the page: OCR its word box again, alone and with an A-Z 0-9 whitelist
+if pan_confidence != 'valid':
+    reread = pan_number.reread(gray, result)
+    if reread[0] is not None:
+        pan, pan_confidence = reread
+
 # Making tuples of data
 data = {}
 data['Name'] = name
 data['Father Name'] = fname
 data['Date of Birth'] = dob
 data['PAN'] = pan
+data['PAN Confidence'] = pan_confidence
 
 # print(data)
 
 ###############################################################################################################
-######################################### Section 6: Write Data to JSONs ######################################
+######################################### Section 6: Write the record #########################################
 ###############################################################################################################
 
-# Writing data into JSON
-try:
-    to_unicode = unicode
-except NameError:
-    to_unicode = str
-
-# Write JSON file
-with io.open('data.json', 'w', encoding='utf-8') as outfile:
-    str_ = json.dumps(data, indent=4, sort_keys=True, separators=(',', ': '), ensure_ascii=False)
-    outfile.write(to_unicode(str_))
-
-# Read JSON file
-with open('data.json', encoding = 'utf-8') as data_file:
-    data_loaded = json.load(data_file)
-
-# print(data == data_loaded)
-
-# Reading data back JSON(give correct path where JSON is stored)
-with open('data.json', 'r', encoding= 'utf-8') as f:
-    ndata = json.load(f)
-
-print(ndata)
+# Write the record to the chosen sink
+with open_sink(args["output"]) as sink:
+    sink.write({'File': args["image"], 'Document Type': 'PAN', 'Data': data})
 
 print('\t', "|+++++++++++++++++++++++++++++++|")
-print('\t', '|', '\t', ndata['Name'])
+print('\t', '|', '\t', data['Name'])
 print('\t', "|-------------------------------|")
-print('\t', '|', '\t', ndata['Father Name'])
+print('\t', '|', '\t', data['Father Name'])
 print('\t', "|-------------------------------|")
-print('\t', '|', '\t', ndata['Date of Birth'])
+print('\t', '|', '\t', data['Date of Birth'])
 print('\t', "|-------------------------------|")
-print('\t', '|', '\t', ndata['PAN'])
-print('\t', "|+++++++++++++++++++++++++++++++|")
\ No newline at end of file
+print('\t', '|', '\t', data['PAN'])
+print('\t', "|+++++++++++++++++++++++++++++++|")
@@ -0,0 +1,110 @@
+'''
+Turn card photos the right way up before anything expensive runs.
+
+Photos taken on a phone usually carry an EXIF Orientation tag, which
+cv2.imread and cv2.imdecode already apply. The tag is often just 1
+(upright) whatever the shot, a card can lie turned within the photo, and
+scans, screenshots and re-saved crops have none, so any of them can still
+be on their side or upside down, and Tesseract then returns garbage. detect() decides the rotation on a
+small binary thumbnail:
+
+    sideways    text lines are long horizontal blobs, so the thumbnail has
+                far more line-shaped area one way up than turned 90 degrees
+    upside down Devanagari headlines sit on top of their line, and Latin
+                ascenders and capitals stick out above the x-height band
+                more than descenders do below it; each line votes
+
+When the lines don't vote clearly (all-capital text, few lines) Tesseract
+OSD is asked on the same reduced image, if its osd model is installed.
+
+    image, angle = orientation.upright(image)
+'''
+
+import re
+
+import cv2
+import numpy as np
+import pytesseract
+
+from misc import devanagari, metrics, quality
+
+THUMB_DIM = 800
+# Sideways only when turning the thumbnail gives this much more line area.
+SIDEWAYS_RATIO = 1.5
+# Below this many votes either way the lines can't tell 0 from 180.
+MIN_VOTES = 3
+ROTATIONS = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+
+
+def rotate(image, angle):
+    """image turned clockwise by angle (0, 90, 180 or 270)."""
+    return cv2.rotate(image, ROTATIONS[angle]) if angle else image
+
+
+def _line_area(binary):
+    return sum(w * h for _, _, w, h in devanagari.line_rects(binary))
+
+
+def _line_votes(binary):
+    """Positive when the text lines look upright, negative when they look
+    upside down."""
+    votes = 0
+    for x, y, w, h in devanagari.line_rects(binary):
+        line = binary[y:y + h, x:x + w]
+        headline = devanagari.is_devanagari(line) - devanagari.is_devanagari(line[::-1, ::-1])
+        if headline:
+            votes += 2 * headline
+            continue
+        rows = np.count_nonzero(line, axis=1)
+        band = np.flatnonzero(rows >= 0.5 * rows.max())
+        above, below = rows[:band[0]].sum(), rows[band[-1] + 1:].sum()
+        if above + below < 0.05 * rows.sum():
+            continue
+        if above > 1.5 * below:
+            votes += 1
+        elif below > 1.5 * above:
+            votes -= 1
+    return votes
+
+
+def osd_angle(gray):
+    """Clockwise rotation Tesseract OSD says gray needs, or None when OSD
+    is unavailable or finds too little text."""
+    try:
+        osd = pytesseract.image_to_osd(gray, config='--psm 0')
+    except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError):
+        return None
+    m = re.search(r'Rotate: (\d+)', osd)
+    return int(m.group(1)) % 360 if m else None
+
+
+def detect(image):
+    """Clockwise rotation (0, 90, 180 or 270) that makes image upright."""
+    with metrics.timed('orient'):
+        gray = quality.thumbnail(image, THUMB_DIM)
+        binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+        turned = cv2.rotate(binary, cv2.ROTATE_90_CLOCKWISE)
+        angle = 0
+        if _line_area(turned) > SIDEWAYS_RATIO * _line_area(binary):
+            angle, binary = 90, turned
+        votes = _line_votes(binary)
+        if votes <= -MIN_VOTES:
+            angle += 180
+        elif votes < MIN_VOTES:
+            osd = osd_angle(gray)
+            if osd is not None:
+                metrics.count('orient_osd')
+                angle = osd
+    return angle % 360
+
+
+def upright(image):
+    """(image, angle): image turned the right way up, and the clockwise
+    rotation that took. Run it even on files with an EXIF Orientation tag:
+    most phones write 1 (upright) whatever the shot, and a card can lie
+    turned within a correctly tagged photo."""
+    angle = detect(image)
+    if angle:
+        metrics.count('rotated')
+        image = rotate(image, angle)
+    return image, angle
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+'''Read multi-page scans one page at a time.
+Usage:
+    python -m misc.pages scan.pdf [--dpi 300] [-p thresh] [-o out.jsonl]
+    python -m misc.pages scan.tiff
+Runs every page through engine.extract and writes one record per page,
+with "File" and "Page" (0-based) set.
+
+cv2.imread only returns the first page of a TIFF and cannot read PDFs.
+iter_pages() is a generator: TIFF pages are decoded by Pillow one frame at
+a time, PDF pages are rasterized one at a time by PyMuPDF (optional, only
+imported for PDFs), so at most one page is held in memory whatever the
+document length.
+'''
+
+import argparse
+import os
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from misc import engine, metrics
+from misc.sinks import open_sink
+
+PDF_DPI = 300
+MULTIPAGE_EXTENSIONS = ('.pdf', '.tif', '.tiff')
+
+
+def _to_bgr(page):
+    # cv2.imread would apply the Orientation tag; Pillow leaves it to us.
+    page = ImageOps.exif_transpose(page)
+    if page.mode.startswith('I;16'):
+        # 16-bit scans: convert('L') would clip everything above 255 to white.
+        return (np.asarray(page) >> 8).astype(np.uint8)
+    if page.mode in ('I', 'F'):
+        # No fixed range for 32-bit pages; stretch their maximum to white.
+        array = np.asarray(page, np.float64)
+        top = array.max()
+        return np.clip(array * (255.0 / top if top > 0 else 0.0), 0, 255).astype(np.uint8)
+    if page.mode not in ('L', 'RGB'):
+        page = page.convert('L' if page.mode == '1' else 'RGB')
+    array = np.asarray(page)
+    return cv2.cvtColor(array, cv2.COLOR_RGB2BGR) if array.ndim == 3 else array
+
+
+def iter_tiff(path, dpi=None):
+    """Yield (index, image) for each page of a TIFF. With dpi set, pages
+    that record their own resolution are resampled to it."""
+    with Image.open(path) as tiff:
+        index = 0
+        while True:
+            try:
+                tiff.seek(index)
+            except EOFError:
+                return
+            with metrics.timed('decode'):
+                page = tiff
+                native = tiff.info.get('dpi')
+                if dpi and native and native[0]:
+                    scale = float(dpi) / float(native[0])
+                    if abs(scale - 1.0) > 0.01:
+                        size = (max(1, int(tiff.width * scale)), max(1, int(tiff.height * scale)))
+                        page = tiff.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+                image = _to_bgr(page)
+            yield index, image
+            index += 1
+
+
+def iter_pdf(path, dpi=PDF_DPI):
+    """Yield (index, image) for each page of a PDF rasterized at dpi, in
+    grayscale. Needs PyMuPDF (pip install pymupdf)."""
+    try:
+        import fitz
+    except ImportError:
+        raise ImportError('reading PDFs needs PyMuPDF: pip install pymupdf')
+    with fitz.open(path) as doc:
+        for index, page in enumerate(doc):
+            with metrics.timed('decode'):
+                pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                # samples is padded to stride per row; copy so the pixmap can go.
+                image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+                del pix
+            yield index, image
+
+
+def iter_pages(path, dpi=None):
+    """Yield (index, image) for every page of path: each page of a PDF or
+    TIFF, or index 0 and the image itself for anything else."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.pdf':
+        return iter_pdf(path, dpi or PDF_DPI)
+    if ext in ('.tif', '.tiff'):
+        return iter_tiff(path, dpi)
+    return iter([(0, engine.load_image(path))])
+
+
+def extract_pages(path, dpi=None, **kwargs):
+    """Yield one Extraction per page; kwargs go to engine.extract."""
+    for index, image in iter_pages(path, dpi):
+        metrics.count('pages')
+        yield index, engine.extract(image, **kwargs)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('path', help='multi-page PDF or TIFF (a single image also works)')
+    ap.add_argument('--dpi', type=int, help='render PDFs / resample TIFFs at this resolution (PDF default: %d)' % PDF_DPI)
+    ap.add_argument("-p", "--preprocess", type=str, default="thresh", choices=engine.PREPROCESS_MODES,
+                    help="type of preprocessing applied to every page")
+    ap.add_argument("-t", "--type", choices=sorted(engine.PARSERS), help="document type (default: classify each page)")
+    ap.add_argument("-o", "--output", default="-", help="where to write records: - (stdout), *.jsonl, *.db or a directory/")
+    args = ap.parse_args()
+
+    with open_sink(args.output) as sink:
+        for index, record in extract_pages(args.path, args.dpi, doc_type=args.type, mode=args.preprocess):
+            out = record.to_dict()
+            out['File'] = args.path
+            out['Page'] = index
+            sink.write(out)
@@ -0,0 +1,132 @@
+'''
+PAN decoding against the fixed structure of the number.
+
+A PAN is five letters, four digits and a letter: AAAPL1234C. The fourth
+letter is the holder type (P person, C company, H HUF, F firm, ...), and
+for a person the fifth is the initial of the surname. Knowing which
+positions are letters and which are digits, decode() maps each character
+with its own confusion table (0->O, 8->B, 5->S in letter positions;
+O->0, B->8, S->5 in digit positions) instead of replacing characters
+across the whole line, then checks the holder type. Candidates come from
+single words or words split where the layout breaks, never from words run
+together, and the one needing the fewest mappings wins.
+
+    pan, confidence = pan_number.decode(line)
+
+When the full-page read doesn't give a valid PAN, reread() OCRs just the
+word box it came from again, with an A-Z 0-9 whitelist.
+'''
+
+import re
+
+from misc.ocr import ocr_image
+
+LETTER, DIGIT = 'A', '9'
+LAYOUT = LETTER * 5 + DIGIT * 4 + LETTER
+# Holder types: company, person, HUF, firm, AOP, trust, BOI, local
+# authority, artificial juridical person, government, LLP.
+ENTITY_TYPES = 'CPHFATBLJGE'
+TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '4': 'A', '5': 'S', '6': 'G', '7': 'T', '8': 'B',
+             '%': 'L', '$': 'S', '|': 'I', '!': 'I'}
+TO_DIGIT = {'O': '0', 'D': '0', 'Q': '0', 'U': '0', 'I': '1', 'L': '1', 'J': '1', '|': '1', '!': '1',
+            'Z': '2', 'A': '4', 'S': '5', '$': '5', 'G': '6', 'b': '6', 'T': '7', 'B': '8', 'g': '9', 'q': '9'}
+WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+OCR_CONFIG = '--psm 7 -c tessedit_char_whitelist=%s' % WHITELIST
+
+_PAN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]$')
+_WINDOW = re.compile(r'(?=([A-Za-z0-9%$|!]{10}))')
+# Where a PAN printed or read in pieces may be split: AAAAA 9999 A.
+_GAPS = (5, 9)
+# Digit positions that must have been read as digits.
+MIN_DIGITS = 3
+
+
+def decode_window(raw):
+    """(pan, confidence) for a 10-character read, or (None, None).
+    confidence is 'valid' when it was read as printed and 'corrected' when
+    positions had to be mapped; either way the holder type is checked, and
+    at least MIN_DIGITS of the four digit positions must be real digits, so
+    a word of letters cannot pass for the number."""
+    if sum(c.isdigit() for c in raw[5:9]) < MIN_DIGITS:
+        return None, None
+    out = []
+    for c, kind in zip(raw, LAYOUT):
+        if kind == LETTER:
+            c = TO_LETTER.get(c, c).upper()
+        else:
+            c = TO_DIGIT.get(c, TO_DIGIT.get(c.upper(), c))
+        out.append(c)
+    pan = ''.join(out)
+    if not _PAN.match(pan) or pan[3] not in ENTITY_TYPES:
+        return None, None
+    return pan, 'valid' if pan == raw else 'corrected'
+
+
+def candidates(line):
+    """10-character reads in a line: windows inside one token (with stray
+    punctuation squeezed out), and runs of tokens split only where the
+    layout has a break (ABCDE 1234 F)."""
+    tokens = [re.sub(r'["\';:.,-]+', '', t) for t in line.split()]
+    tokens = [t for t in tokens if t]
+    for token in tokens:
+        for m in _WINDOW.finditer(token):
+            yield m.group(1)
+    for i in range(len(tokens)):
+        joined = tokens[i]
+        for token in tokens[i + 1:]:
+            if len(joined) not in _GAPS:
+                break
+            joined += token
+            if len(joined) == len(LAYOUT):
+                yield joined
+                break
+
+
+def decode(text):
+    """Best PAN in a line (or lines) of OCR text: the candidate that needed
+    the fewest positions mapped, the first of equals."""
+    best, best_changes = (None, None), None
+    for line in text.splitlines():
+        for raw in candidates(line):
+            pan, confidence = decode_window(raw)
+            if pan is None:
+                continue
+            changes = sum(a != b for a, b in zip(pan, raw))
+            if best_changes is None or changes < best_changes:
+                best, best_changes = (pan, confidence), changes
+            if not changes:
+                return best
+    return best
+
+
+def clean_name(name):
+    """Map digit and symbol look-alikes to letters in a name line; names on a
+    PAN card never contain digits."""
+    name = ''.join(TO_LETTER.get(c, c) for c in name.strip())
+    return re.sub(r'[^a-zA-Z ]+', ' ', name).strip()
+
+
+def reread(gray, ocr, pad=4):
+    """OCR the word box most likely to hold the PAN again, alone and with
+    the A-Z 0-9 whitelist. gray is the image ocr came from. Returns
+    (pan, confidence) or (None, None)."""
+    best, best_i = None, None
+    for i, word in enumerate(ocr.words):
+        squeezed = re.sub(r'\W+', '', word)
+        if len(squeezed) < 8 or len(squeezed) > 12:
+            continue
+        # Prefer the word that already fits the layout best.
+        score = sum(1 for c, kind in zip(squeezed, LAYOUT)
+                    if (c.isalpha() if kind == LETTER else c.isdigit()))
+        if best is None or score > best:
+            best, best_i = score, i
+    if best_i is None:
+        return None, None
+    box = ocr.word_boxes[best_i]
+    h, w = gray.shape[:2]
+    x1, y1 = max(0, box['left'] - pad), max(0, box['top'] - pad)
+    x2, y2 = min(w, box['left'] + box['width'] + pad), min(h, box['top'] + box['height'] + pad)
+    crop = gray[y1:y2, x1:x2]
+    if crop.size == 0:
+        return None, None
+    return decode(ocr_image(crop, config=OCR_CONFIG).text)
@@ -0,0 +1,159 @@
+'''
+Perceptual hashes of card images and a Hamming-distance index over them.
+
+A byte-level cache misses the usual re-upload: the same card photographed
+again, or re-saved at another JPEG quality. pHash (low DCT frequencies of a
+32x32 thumbnail against their median) survives both, so near-identical
+cards land within a few bits of each other. So do two cards printed on
+one template that differ only in the holder's name and number, so a near
+hash is only a candidate: HashCache returns the stored Extraction with
+an exact flag, set only when a strong hash of the pixels (BLAKE2b) matches
+too. engine.extract() reuses an exact hit as is, and a near hit only once
+the number words read the same on the new image. It holds at most
+MAX_ENTRIES of them and drops the least recently used, so a long-running
+daemon's memory stays bounded.
+
+    cache = HashCache()
+    record = engine.extract(image, cache=cache)
+'''
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Bits out of 64 two hashes may differ by and still be a candidate for the
+# same card. Re-encodes and rescales of one photo stay within ~4 bits, but
+# so do different holders' cards on one template (4-8 bits), which is why
+# a near hit is never reused unchecked.
+MAX_DISTANCE = 6
+# Extractions a HashCache keeps, each a few KB with its OCR words.
+MAX_ENTRIES = 10000
+
+
+def _gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def _pack(bits):
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+def dhash(image):
+    """64-bit difference hash: is each pixel of a 9x8 thumbnail brighter
+    than its right-hand neighbour. Cheapest, but shifts with crop changes."""
+    small = cv2.resize(_gray(image), (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def phash(image):
+    """64-bit DCT hash: the 8x8 lowest frequencies of a 32x32 thumbnail,
+    each compared to their median (the DC term is left out of the median)."""
+    small = cv2.resize(_gray(image), (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(small))[:8, :8]
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def digest(image):
+    """Strong hash of the pixels and their shape: equal only for the same image."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((image.shape, image.dtype.str)).encode('ascii'))
+    h.update(np.ascontiguousarray(image).data)
+    return h.digest()
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree(object):
+    """Burkhard-Keller tree over 64-bit hashes. Each node keeps its
+    children keyed by their distance to it, so a radius-r search only
+    descends into children whose key is within r of the query's distance."""
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, h, value):
+        self.size += 1
+        if self.root is None:
+            self.root = (h, value, {})
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, value, {})
+                return
+            node = child
+
+    def search(self, h, radius):
+        """(distance, value) pairs within radius of h, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                found.append((d, node[1]))
+            for k, child in node[2].items():
+                if d - radius <= k <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda f: f[0])
+        return found
+
+    def __len__(self):
+        return self.size
+
+
+class HashCache(object):
+    """Thread-safe image -> value index; the daemon shares one across
+    request threads. Keys are (perceptual hash, digest) pairs from key().
+    Past max_entries values the least recently used is dropped. The
+    BK-tree cannot delete, so it indexes (hash, digest) pairs only, values
+    live in an OrderedDict by digest in use order, and the tree is rebuilt
+    from the live entries once evicted ones make up half of it."""
+    def __init__(self, max_distance=MAX_DISTANCE, hash_fn=phash, max_entries=MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.hash_fn = hash_fn
+        self.max_entries = max_entries
+        self.tree = BKTree()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, image):
+        return self.hash_fn(image), digest(image)
+
+    def get(self, key):
+        """(value, exact) for the same image (exact=True), else for the
+        nearest hash within max_distance (exact=False), else (None, False)."""
+        h, d = key
+        with self.lock:
+            if d in self.entries:
+                self.entries.move_to_end(d)
+                return self.entries[d][1], True
+            for _, near in self.tree.search(h, self.max_distance):
+                if near in self.entries:
+                    self.entries.move_to_end(near)
+                    return self.entries[near][1], False
+        return None, False
+
+    def put(self, key, value):
+        h, d = key
+        with self.lock:
+            if d not in self.entries:
+                self.tree.add(h, d)
+            self.entries[d] = (h, value)
+            self.entries.move_to_end(d)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if len(self.tree) > 2 * self.max_entries:
+                self.tree = BKTree()
+                for d, (h, _) in self.entries.items():
+                    self.tree.add(h, d)
+
+    def __len__(self):
+        return len(self.entries)
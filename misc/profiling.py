@@ -0,0 +1,146 @@
+'''
+Profiling for extraction runs.
+
+Profiler.profile() wraps a block with both cProfile (exact per-function
+counts and cumulative times) and a sampling thread that records the Python
+stack of every thread every few milliseconds. Samples are rooted at the
+pipeline stage active on that thread (see metrics.timed), so a flamegraph
+shows e.g. [parse] -> clean_text -> ftfy.fix_text directly.
+
+State is plain picklable data; worker processes hand theirs back with
+state() and the parent add()s it before write()-ing the report:
+
+    profile.txt        pstats report sorted by cumulative time
+    profile.pstats     raw stats for snakeviz / pstats
+    profile.collapsed  "frame;frame;frame count" lines for flamegraph.pl
+'''
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from misc import metrics
+
+SAMPLE_INTERVAL = 0.005
+REPORT_LINES = 60
+
+
+class _Stats(object):
+    """Adapter so pstats.Stats can be built from a bare stats dict."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _frame_label(code):
+    return '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+
+
+class StackSampler(object):
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner = None
+        self._root = None
+
+    def start(self, root=None):
+        """Start sampling. Stacks of the calling thread are cut at frame
+        root, so frames above the profiled block don't prefix every line."""
+        self._owner = threading.get_ident()
+        self._root = root
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                # Idle pool and feeder threads would only add noise; keep the
+                # profiled thread and any thread inside a timed stage.
+                if ident == me or (ident != self._owner and ident not in metrics.ACTIVE_STAGES):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    if frame is self._root:
+                        break
+                    frame = frame.f_back
+                labels.append('[%s]' % metrics.ACTIVE_STAGES.get(ident, 'other'))
+                self.stacks[';'.join(reversed(labels))] += 1
+
+
+class Profiler(object):
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stats = {}
+        self.stacks = Counter()
+        self.wall = 0.0
+
+    @contextmanager
+    def profile(self):
+        prof = cProfile.Profile()
+        sampler = StackSampler(self.interval)
+        start = time.time()
+        # Frame 2 is whoever entered the with-block (1 is contextlib's __enter__).
+        sampler.start(root=sys._getframe(2))
+        prof.enable()
+        try:
+            yield self
+        finally:
+            prof.disable()
+            sampler.stop()
+            self.wall += time.time() - start
+            prof.create_stats()
+            self.add((prof.stats, sampler.stacks, 0.0))
+
+    def state(self):
+        """Return (stats, stacks, wall) and reset."""
+        state = (self.stats, dict(self.stacks), self.wall)
+        self.stats, self.stacks, self.wall = {}, Counter(), 0.0
+        return state
+
+    def add(self, state):
+        stats, stacks, wall = state
+        if stats:
+            merged = pstats.Stats(_Stats(stats))
+            if self.stats:
+                merged.add(_Stats(self.stats))
+            self.stats = merged.stats
+        self.stacks.update(stacks)
+        self.wall += wall
+
+    def report(self, sort='cumulative', lines=REPORT_LINES):
+        out = io.StringIO()
+        out.write('wall time profiled: %.2f s, stack samples: %d\n\n' % (self.wall, sum(self.stacks.values())))
+        if self.stats:
+            stats = pstats.Stats(_Stats(self.stats), stream=out)
+            stats.strip_dirs().sort_stats(sort).print_stats(lines)
+        return out.getvalue()
+
+    def write(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, 'profile.txt'), 'w', encoding='utf-8') as f:
+            f.write(self.report())
+        if self.stats:
+            pstats.Stats(_Stats(self.stats)).dump_stats(os.path.join(out_dir, 'profile.pstats'))
+        with open(os.path.join(out_dir, 'profile.collapsed'), 'w', encoding='utf-8') as f:
+            for stack, n in sorted(self.stacks.items()):
+                f.write('%s %d\n' % (stack, n))
+
+
+PROFILER = Profiler()
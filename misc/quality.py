@@ -0,0 +1,178 @@
+'''
+Cheap image-quality scores, computed on a small grayscale thumbnail.
+
+    sharpness  variance of the Laplacian; drops quickly with motion or
+               focus blur
+    glare      largest blown-out patch where the card is not otherwise
+               white, as a fraction of the card (or frame): saturated
+               pixels over a local background, taken from the coarse
+               brightness around them and floored at the card's median,
+               well below saturation. White paper and a white scan bed are
+               the background, not glare
+    coverage   share of the frame taken by the largest card outline
+               (0 when no outline is found, e.g. a close-up)
+    contrast   5th to 95th percentile grey-level spread
+    dpi        card width in pixels over the 3.37 in of an ID-1 card; the
+               whole image width when no large card outline is found
+
+Each takes a few milliseconds, so every frame of a clip can be scored, and
+every upload checked, before anything is sent to OCR. check() turns the
+scores into a machine-readable verdict for engine.extract(gate=True).
+'''
+
+import cv2
+import numpy as np
+
+from misc import cards, metrics
+
+THUMB_DIM = 480
+GLARE_LEVEL = 250
+# Saturated pixels count as glare where the background is this far below
+# GLARE_LEVEL; the background map is sampled in cells of GLARE_CELL px.
+GLARE_MARGIN = 30
+GLARE_CELL = 24
+CARD_WIDTH_IN = 3.37
+# Smaller outlines are more likely a photo box or logo than the card, so
+# dpi falls back to the image width.
+DPI_MIN_COVERAGE = 0.25
+
+# Reject thresholds, set against the sample cards: every sample passes, a
+# 15 px Gaussian blur of the small (500 px wide or less) ones fails on
+# sharpness, and a glare spot a quarter of the card wide fails on glare
+# on every sample whose paper is not itself blown out.
+MIN_SHARPNESS = 250.0
+MAX_GLARE = 0.05
+MIN_CONTRAST = 40.0
+MIN_DPI = 100.0
+# Below this the image is upscaled ('cubic' preprocessing) instead of
+# rejected; Tesseract wants text at roughly 300 DPI.
+UPSCALE_DPI = 200.0
+
+SCORE_BUCKETS = {
+    'sharpness': (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000),
+    'glare': (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.4),
+    'coverage': (0.05, 0.1, 0.2, 0.4, 0.6, 0.8, 0.95),
+    'contrast': (20, 40, 60, 80, 120, 160, 200, 240),
+    'dpi': (50, 100, 150, 200, 250, 300, 400, 600),
+}
+
+
+class QualityError(ValueError):
+    """Raised by engine.extract(gate=True) for an image not worth OCR.
+    reason is one of 'blurry', 'glare', 'low_contrast', 'low_resolution'."""
+    def __init__(self, reason, scores):
+        ValueError.__init__(self, 'image rejected: %s' % reason)
+        self.reason = reason
+        self.scores = scores
+
+    def to_dict(self):
+        return {'Rejected': self.reason,
+                'Quality': dict((k, round(v, 4)) for k, v in self.scores.items())}
+
+
+def _thumbnail(image, max_dim=THUMB_DIM):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return cards._scale_down(gray, max_dim)
+
+
+def thumbnail(image, max_dim=THUMB_DIM):
+    """Grayscale copy of image no larger than max_dim on its long side."""
+    return _thumbnail(image, max_dim)[1]
+
+
+def sharpness(gray):
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S, ksize=3))
+    return float(std[0, 0]) ** 2
+
+
+def glare_background(gray, region):
+    """Brightness gray would have without highlights: a coarse map with the
+    saturated cells filled in from around them, floored at the median of
+    region (the card), so a card that is white all over has no glare."""
+    h, w = gray.shape
+    small = cv2.resize(gray, (max(1, w // GLARE_CELL), max(1, h // GLARE_CELL)), interpolation=cv2.INTER_AREA)
+    holes = (small >= GLARE_LEVEL - 10).astype(np.uint8)
+    if holes.all():
+        return np.full_like(gray, 255)
+    if holes.any():
+        small = cv2.inpaint(small, holes, 3, cv2.INPAINT_TELEA)
+    background = cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+    return np.maximum(background, np.uint8(np.median(gray[region])))
+
+
+def glare(gray, quad=None):
+    """Largest blown-out patch as a fraction of the card outline quad (the
+    whole frame without one), counting only pixels inside it."""
+    if quad is None:
+        region = np.ones(gray.shape, dtype=bool)
+    else:
+        region = cv2.fillConvexPoly(np.zeros_like(gray), np.asarray(quad, dtype=np.int32).reshape(-1, 2), 1) > 0
+    mask = (gray >= GLARE_LEVEL) & (glare_background(gray, region) <= GLARE_LEVEL - GLARE_MARGIN) & region
+    stats = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)[2]
+    return float(stats[1:, 4].max() / np.count_nonzero(region)) if len(stats) > 1 else 0.0
+
+
+def _largest_card(gray):
+    found = cards.find_cards(gray)
+    if not found:
+        return None
+    return max((quad for quad, _ in found), key=cv2.contourArea)
+
+
+def coverage(gray):
+    quad = _largest_card(gray)
+    return 0.0 if quad is None else cv2.contourArea(quad) / float(gray.size)
+
+
+def contrast(gray):
+    lo, hi = np.percentile(gray, (5, 95))
+    return float(hi - lo)
+
+
+def frame_scores(image):
+    """Sharpness, glare and coverage of one frame, plus a combined score
+    for ranking frames of the same clip (not comparable across clips)."""
+    gray = thumbnail(image)
+    quad = _largest_card(gray)
+    cover = 0.0 if quad is None else cv2.contourArea(quad) / float(gray.size)
+    scores = {'sharpness': sharpness(gray), 'glare': glare(gray, quad if cover >= DPI_MIN_COVERAGE else None),
+              'coverage': cover}
+    scores['score'] = (scores['sharpness'] * (1.0 - min(1.0, scores['glare'] / MAX_GLARE)) ** 2 *
+                       (0.5 + 0.5 * min(1.0, scores['coverage'])))
+    return scores
+
+
+def assess(image):
+    """All five scores for one image."""
+    scale, gray = _thumbnail(image)
+    quad = _largest_card(gray)
+    cover = 0.0 if quad is None else cv2.contourArea(quad) / float(gray.size)
+    if cover >= DPI_MIN_COVERAGE:
+        card_px = max(cv2.minAreaRect(quad)[1]) / scale
+    else:
+        quad = None
+        card_px = max(image.shape[:2])
+    return {'sharpness': sharpness(gray), 'glare': glare(gray, quad), 'coverage': cover,
+            'contrast': contrast(gray), 'dpi': card_px / CARD_WIDTH_IN}
+
+
+def check(image):
+    """Score image and decide whether it is worth OCR.
+    Returns (reason, scores): reason is None for a usable image, otherwise
+    the first failed check. Scores and rejections go to the metrics registry."""
+    with metrics.timed('quality'):
+        scores = assess(image)
+    for name, value in scores.items():
+        metrics.score(name, value, SCORE_BUCKETS[name])
+    reason = None
+    if scores['dpi'] < MIN_DPI:
+        reason = 'low_resolution'
+    elif scores['contrast'] < MIN_CONTRAST:
+        reason = 'low_contrast'
+    elif scores['sharpness'] < MIN_SHARPNESS:
+        reason = 'blurry'
+    elif scores['glare'] > MAX_GLARE:
+        reason = 'glare'
+    if reason:
+        metrics.count('rejected_%s' % reason)
+    return reason, scores
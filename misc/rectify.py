@@ -0,0 +1,88 @@
+'''
+Perspective-correct a photographed card onto a fixed-size raster.
+
+A card shot at an angle is a quadrilateral, not a rectangle, and cropping
+its bounding box keeps the background around it, the keystone distortion,
+and whatever size the photo happened to be. rectify() finds the card's
+corners (cards.find_cards), computes the homography onto an upright
+rectangle and warps the card once, to CARD_SIZE: an ID-1 card (85.6 x 54
+mm) at 300 DPI, Tesseract's preferred resolution. Everything after it sees
+the same raster for every card, so regions and buffers can be fixed and
+per-card cost is predictable. An outline with other proportions (a passport
+page, a letter) keeps them: it is warped to CARD_SIZE's width only.
+
+    card = rectify.rectify(image)       # None when it isn't a card
+    card = rectify.warp_card(image, quad)
+'''
+
+import cv2
+import numpy as np
+
+from misc import cards, metrics, quality
+
+CARD_SIZE = (1011, 638)
+ID1_ASPECT = 85.6 / 54
+# An outline, or an uncropped image, is taken for an ID-1 card when its
+# aspect ratio is within this fraction of ID-1's; a passport page (1.42)
+# is not.
+ASPECT_TOLERANCE = 0.05
+
+
+def order_corners(quad):
+    """The four corners of quad as top-left, top-right, bottom-right,
+    bottom-left (float32). The top-left corner has the smallest x + y, the
+    top-right the smallest y - x."""
+    pts = np.asarray(quad, dtype=np.float32).reshape(4, 2)
+    s = pts.sum(axis=1)
+    d = pts[:, 1] - pts[:, 0]
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]],
+                    dtype=np.float32)
+
+
+def is_id1(width, height):
+    """True when a width x height outline has ID-1 proportions, either way up."""
+    return abs(max(width, height) / float(min(width, height)) / ID1_ASPECT - 1) <= ASPECT_TOLERANCE
+
+
+def warp_card(image, quad, size=CARD_SIZE):
+    """Warp the card whose corners are quad onto a size (width, height)
+    raster. A card standing on its short side is warped to (height, width),
+    so the text keeps its orientation. A quad without ID-1 proportions is
+    not stretched to fit: its height follows its own aspect ratio."""
+    tl, tr, br, bl = corners = order_corners(quad)
+    width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    if not is_id1(width, height):
+        metrics.count('rectify_other_aspect')
+        size = (size[0], int(round(size[0] * min(width, height) / max(width, height))))
+    w, h = size if width >= height else size[::-1]
+    with metrics.timed('rectify'):
+        # Warping samples the source at one point per output pixel, so a card
+        # much larger than the output is first shrunk with area averaging.
+        scale = max(w / width, h / height)
+        if scale < 0.5:
+            image = cv2.resize(image, None, fx=2 * scale, fy=2 * scale, interpolation=cv2.INTER_AREA)
+            corners = corners * (2 * scale)
+        target = np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(corners, target)
+        return cv2.warpPerspective(image, matrix, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def rectify(image, size=CARD_SIZE):
+    """The largest card in image, warped to size. Outlines covering less
+    than quality.DPI_MIN_COVERAGE of the image are more likely a photo box
+    than the card, and are ignored. An image with no card outline but
+    ID-1 proportions is taken to be cropped to the card already and is
+    just resized; anything else (a passport page) gives None."""
+    h, w = image.shape[:2]
+    with metrics.timed('crop'):
+        found = [q for q, _ in cards.find_cards(image)
+                 if cv2.contourArea(q) >= quality.DPI_MIN_COVERAGE * w * h]
+    if found:
+        return warp_card(image, max(found, key=cv2.contourArea), size)
+    if is_id1(w, h):
+        metrics.count('rectify_resized')
+        out = size if w >= h else size[::-1]
+        return cv2.resize(image, out, interpolation=cv2.INTER_AREA if w > out[0] else cv2.INTER_CUBIC)
+    metrics.count('rectify_missing')
+    return None
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+'''Pack many small card images into a few large shard files.
+Usage:
+    python -m misc.shards pack images/ -o shards/ [--shard-mb 256]
+    python -m misc.shards list shards/
+Then run the batch over the shards instead of the images:
+    python -m misc.batch -j 8 -o results.jsonl shards/
+
+A run over hundreds of thousands of small JPEGs spends much of its time in
+directory scans and open/stat/close, worst on network filesystems. A shard
+is the image files' bytes back to back (NAME.shard) plus an index of
+[name, offset, length] entries (NAME.shard.idx, JSON). ShardReader maps
+the shard read-only and hands cv2.imdecode a numpy view of each member, so
+the bytes are never copied out of the page cache.
+
+Shards are claimed with an O_EXCL NAME.shard.claim file, so any number of
+batch runs, on one machine or several sharing the directory, can work
+through the same shards without splitting them up beforehand. A shard
+that fails as a whole has its claim released; delete the other .claim
+files to process the shards again.
+'''
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import socket
+
+import cv2
+import numpy as np
+
+from misc import metrics
+from misc.common import image_extensions
+
+SHARD_BYTES = 256 * 1024 * 1024
+
+
+class ShardReader(object):
+    def __init__(self, path):
+        self.path = path
+        with open(path + '.idx', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __len__(self):
+        return len(self.index)
+
+    def member_bytes(self, offset, length):
+        """Zero-copy uint8 view of one member's encoded bytes."""
+        return np.frombuffer(self.map, np.uint8, count=length, offset=offset)
+
+    def __iter__(self):
+        """Yield (name, image) for every member; image is None if it does
+        not decode (cv2.imdecode raises on an empty member rather than
+        returning None)."""
+        for name, offset, length in self.index:
+            with metrics.timed('decode'):
+                try:
+                    image = cv2.imdecode(self.member_bytes(offset, length), cv2.IMREAD_COLOR)
+                except cv2.error:
+                    image = None
+            yield name, image
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def claim(path):
+    """Atomically claim a shard for this process. False if already taken."""
+    try:
+        fd = os.open(path + '.claim', os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    os.write(fd, ('%s %d\n' % (socket.gethostname(), os.getpid())).encode('utf-8'))
+    os.close(fd)
+    return True
+
+
+def release(path):
+    """Give up a claim, so a later run processes the shard again."""
+    try:
+        os.remove(path + '.claim')
+    except FileNotFoundError:
+        pass
+
+
+class ShardWriter(object):
+    """Streams members into one shard under a temporary name, recording
+    each one's offset as it is written, so at most one member is held in
+    memory. close() writes the index and renames both files, so readers
+    never see a half-written shard."""
+    def __init__(self, path):
+        self.path = path
+        self.out = open(path + '.tmp', 'wb')
+        self.index = []
+        self.size = 0
+
+    def add(self, name, f):
+        """Copy the open file f into the shard as member name."""
+        offset = self.size
+        shutil.copyfileobj(f, self.out)
+        self.size = self.out.tell()
+        self.index.append([name, offset, self.size - offset])
+
+    def close(self):
+        self.out.close()
+        with open(self.path + '.idx.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(self.path + '.idx.tmp', self.path + '.idx')
+        os.replace(self.path + '.tmp', self.path)
+        return self.path
+
+
+def pack(root, out_dir, shard_bytes=SHARD_BYTES):
+    """Pack every image under root into shards of about shard_bytes each.
+    Member names are paths relative to root. Returns the shard paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    shards, writer = [], None
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in image_extensions:
+                continue
+            if writer is None:
+                writer = ShardWriter(os.path.join(out_dir, 'images-%05d.shard' % len(shards)))
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                writer.add(os.path.relpath(path, root), f)
+            if writer.size >= shard_bytes:
+                shards.append(writer.close())
+                writer = None
+    if writer is not None:
+        shards.append(writer.close())
+    return shards
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('pack', help='pack a directory of images into shards')
+    p.add_argument('root', help='directory of images (searched recursively)')
+    p.add_argument('-o', '--output', required=True, help='directory for the shard files')
+    p.add_argument('--shard-mb', type=int, default=SHARD_BYTES // (1024 * 1024), help='target shard size in MiB')
+    p = sub.add_parser('list', help='show the shards in a directory and their claims')
+    p.add_argument('dir')
+    args = ap.parse_args()
+
+    if args.command == 'pack':
+        for path in pack(args.root, args.output, args.shard_mb * 1024 * 1024):
+            print(path)
+    else:
+        for name in sorted(os.listdir(args.dir)):
+            if name.endswith('.shard'):
+                path = os.path.join(args.dir, name)
+                with open(path + '.idx', encoding='utf-8') as f:
+                    n = len(json.load(f))
+                claimed = os.path.exists(path + '.claim')
+                print('%s\t%d images\t%d bytes\t%s' % (name, n, os.path.getsize(path),
+                                                       'claimed' if claimed else 'free'))
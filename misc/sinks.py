@@ -0,0 +1,149 @@
+'''
+Where extraction records go.
+
+The scripts used to write data.json into the working directory and read it
+back to print it, so two runs in one directory clobbered each other. A sink
+takes record dicts, buffers them and writes them in batches:
+
+    JsonlSink    append JSON lines to one file, one write() per batch
+    SqliteSink   insert into an indexed store.ResultStore, one transaction
+                 per batch, flagging numbers seen before
+    StdoutSink   print each record as indented JSON
+    PerFileSink  one <image name>.json per record in a directory, never
+                 overwriting an existing file
+
+fsync=True makes every flush durable before it returns; by default the OS
+decides, which is what a batch run wants. open_sink() picks a sink from a
+command line value, e.g. "-", "out.jsonl", "results.db" or "jsons/".
+'''
+
+import abc
+import json
+import os
+import sys
+
+from misc.store import ResultStore
+
+BATCH_SIZE = 64
+
+
+class Sink(abc.ABC):
+    """Buffers records and hands them to _write_batch(), which every sink
+    must implement."""
+    def __init__(self, batch_size=BATCH_SIZE, fsync=False):
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.pending = []
+
+    def write(self, record):
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self._write_batch(self.pending)
+            self.pending = []
+
+    @abc.abstractmethod
+    def _write_batch(self, records):
+        """Write records (a non-empty list of dicts)."""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StdoutSink(Sink):
+    def __init__(self, stream=None, indent=4):
+        Sink.__init__(self, batch_size=1)
+        self.stream = stream or sys.stdout
+        self.indent = indent
+
+    def _write_batch(self, records):
+        for record in records:
+            self.stream.write(json.dumps(record, ensure_ascii=False, indent=self.indent) + '\n')
+        self.stream.flush()
+
+
+class JsonlSink(Sink):
+    def __init__(self, path, batch_size=BATCH_SIZE, fsync=False):
+        Sink.__init__(self, batch_size, fsync)
+        # O_APPEND keeps each batch's single write() from interleaving with
+        # another process appending to the same file.
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _write_batch(self, records):
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+        while data:
+            data = data[os.write(self.fd, data):]
+        if self.fsync:
+            os.fsync(self.fd)
+
+    def close(self):
+        Sink.close(self)
+        os.close(self.fd)
+
+
+class SqliteSink(Sink):
+    """Writes into a store.ResultStore, which indexes document numbers and
+    flags records whose number was seen before."""
+    def __init__(self, path, batch_size=BATCH_SIZE, fsync=False):
+        Sink.__init__(self, batch_size, fsync)
+        self.store = ResultStore(path, fsync=fsync)
+
+    def _write_batch(self, records):
+        self.store.add(records)
+
+    def close(self):
+        Sink.close(self)
+        self.store.close()
+
+
+class PerFileSink(Sink):
+    def __init__(self, directory, batch_size=BATCH_SIZE, fsync=False):
+        Sink.__init__(self, batch_size, fsync)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_unique(self, name):
+        """Create <name>.json, or <name>-1.json, <name>-2.json, ... if taken.
+        O_EXCL makes the choice atomic across concurrent runs."""
+        n = 0
+        while True:
+            path = os.path.join(self.directory, '%s%s.json' % (name, '-%d' % n if n else ''))
+            try:
+                return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                n += 1
+
+    def _write_batch(self, records):
+        for record in records:
+            name = os.path.splitext(os.path.basename(record.get('File') or 'data'))[0]
+            fd = self._open_unique(name)
+            try:
+                os.write(fd, json.dumps(record, ensure_ascii=False, indent=4).encode('utf-8'))
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def open_sink(spec, batch_size=BATCH_SIZE, fsync=False, indent=4):
+    """Build a sink from a command line value: "-" for stdout, *.jsonl,
+    *.db / *.sqlite, or a directory (existing, or ending in a slash).
+    indent only applies to stdout; None prints one record per line."""
+    if spec in (None, '-'):
+        return StdoutSink(indent=indent)
+    if spec.endswith(('.jsonl', '.ndjson')):
+        return JsonlSink(spec, batch_size, fsync)
+    if spec.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqliteSink(spec, batch_size, fsync)
+    if os.path.isdir(spec) or spec.endswith(('/', os.sep)):
+        return PerFileSink(spec, batch_size, fsync)
+    raise ValueError('unknown output %r: use -, *.jsonl, *.db or a directory/' % spec)
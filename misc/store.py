@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+'''Local SQLite store of extraction records, indexed by document number.
+Usage:
+    python -m misc.store results.db [--pan ABCDE1234F] [--aadhaar "1234 5678 9012"] [--passport J8369854]
+Prints every stored record carrying that number.
+
+Records are bulk-inserted one transaction per batch. The PAN, Aadhaar and
+passport numbers are normalised (no spaces, upper case) into their own
+columns with partial indexes (PAN and Aadhaar only when their confidence
+is 'valid' or 'corrected'), so "seen before?" is one index probe. add()
+marks each incoming record with 'Seen Before' when its number is already
+stored, or appears earlier in the same batch.
+'''
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+
+from misc import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    file TEXT,
+    doc_type TEXT,
+    pan TEXT,
+    aadhaar TEXT,
+    passport TEXT,
+    created REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_doc_type ON records (doc_type);
+CREATE INDEX IF NOT EXISTS records_pan ON records (pan) WHERE pan IS NOT NULL;
+CREATE INDEX IF NOT EXISTS records_aadhaar ON records (aadhaar) WHERE aadhaar IS NOT NULL;
+CREATE INDEX IF NOT EXISTS records_passport ON records (passport) WHERE passport IS NOT NULL;
+'''
+
+NUMBER_KEYS = ('pan', 'aadhaar', 'passport')
+# Confidence flags (misc/aadhaar.py, misc/pan_number.py) of numbers indexed.
+TRUSTED = ('valid', 'corrected')
+_NUMBER_FORMATS = {
+    'pan': re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]$'),
+    'aadhaar': re.compile(r'^[0-9]{12}$'),
+    'passport': re.compile(r'^[A-Z][0-9]{7}$'),
+}
+
+
+def normalize(key, value):
+    """Canonical form of a document number, or None if it isn't one."""
+    if not value:
+        return None
+    value = re.sub(r'\s+', '', str(value)).upper()
+    return value if _NUMBER_FORMATS[key].match(value) else None
+
+
+def _trusted(data, field):
+    """data[field] when its confidence flag says it was read as printed or
+    repaired beyond doubt; an ambiguous or invalid number may be someone
+    else's."""
+    return data.get(field) if data.get(field + ' Confidence') in TRUSTED else None
+
+
+def numbers(record):
+    """(pan, aadhaar, passport) found in an Extraction.to_dict() record.
+    PAN and Aadhaar numbers count only when 'valid' or 'corrected'."""
+    data = record.get('Data') or {}
+    passport = data.get('Number') if record.get('Document Type') == 'Passport' else None
+    return (normalize('pan', _trusted(data, 'PAN')),
+            normalize('aadhaar', _trusted(data, 'Aadhar')),
+            normalize('passport', passport))
+
+
+class ResultStore(object):
+    def __init__(self, path, fsync=False):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=%s' % ('FULL' if fsync else 'NORMAL'))
+        self.conn.executescript(SCHEMA)
+
+    def seen(self, pan=None, aadhaar=None, passport=None):
+        """True if any of the given numbers is already stored."""
+        for key, value in zip(NUMBER_KEYS, (pan, aadhaar, passport)):
+            value = normalize(key, value)
+            if value and self.conn.execute(
+                    'SELECT 1 FROM records WHERE %s = ? LIMIT 1' % key, (value,)).fetchone():
+                return True
+        return False
+
+    def lookup(self, pan=None, aadhaar=None, passport=None):
+        """Stored records carrying any of the given numbers, oldest first."""
+        out = []
+        for key, value in zip(NUMBER_KEYS, (pan, aadhaar, passport)):
+            value = normalize(key, value)
+            if value:
+                out += [json.loads(r) for r, in self.conn.execute(
+                    'SELECT record FROM records WHERE %s = ? ORDER BY id' % key, (value,))]
+        return out
+
+    def add(self, records):
+        """Insert records in one transaction, flagging 'Seen Before' on each."""
+        now = time.time()
+        batch_seen = set()
+        rows = []
+        for record in records:
+            nums = numbers(record)
+            keyed = [(key, v) for key, v in zip(NUMBER_KEYS, nums) if v]
+            dup = any(k in batch_seen for k in keyed) or self.seen(*nums)
+            batch_seen.update(keyed)
+            record['Seen Before'] = dup
+            if dup:
+                metrics.count('duplicates')
+            rows.append((record.get('File'), record.get('Document Type')) + nums +
+                        (now, json.dumps(record, ensure_ascii=False)))
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO records (file, doc_type, pan, aadhaar, passport, created, record) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return records
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('db', help='SQLite results file written with -o results.db')
+    ap.add_argument('--pan')
+    ap.add_argument('--aadhaar')
+    ap.add_argument('--passport')
+    args = ap.parse_args()
+
+    store = ResultStore(args.db)
+    for record in store.lookup(args.pan, args.aadhaar, args.passport):
+        print(json.dumps(record, ensure_ascii=False))
+    store.close()
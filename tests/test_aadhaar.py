@@ -0,0 +1,50 @@
+import random
+
+from misc import aadhaar, store
+
+
+def real_numbers(n, seed=1):
+    rng = random.Random(seed)
+    while n:
+        head = str(rng.randint(2, 9)) + ''.join(rng.choice('0123456789') for _ in range(10))
+        for check in '0123456789':
+            if aadhaar.verhoeff_valid(head + check):
+                yield head + check
+                n -= 1
+                break
+
+
+def test_digit_misreads_are_not_repaired_blindly():
+    rng = random.Random(2)
+    for number in real_numbers(2000):
+        i = rng.randrange(12)
+        misread = number[:i] + rng.choice(aadhaar.DIGIT_CONFUSIONS[number[i]]) + number[i + 1:]
+        assert aadhaar.decode_candidate(misread) == (misread, 'invalid')
+
+
+def test_random_digits_are_never_corrected():
+    rng = random.Random(3)
+    for _ in range(2000):
+        raw = ''.join(rng.choice('0123456789') for _ in range(12))
+        assert aadhaar.decode_candidate(raw)[1] in ('valid', 'invalid')
+
+
+def test_unsure_positions_are_repaired():
+    letters = {'0': 'O', '1': 'I', '5': 'S', '8': 'B'}
+    for number in real_numbers(200):
+        # A look-alike letter maps straight back.
+        i = next((i for i, d in enumerate(number) if d in letters), None)
+        if i is not None:
+            assert aadhaar.decode_candidate(number[:i] + letters[number[i]] + number[i + 1:]) == (number, 'corrected')
+    number = next(real_numbers(1))
+    # A digit misread with the right digit among OCR's alternatives.
+    wrong = aadhaar.DIGIT_CONFUSIONS[number[5]][0]
+    misread = number[:5] + wrong + number[6:]
+    alternatives = [''] * 5 + [number[5]] + [''] * 6
+    assert aadhaar.decode_candidate(misread, alternatives) == (number, 'corrected')
+
+
+def test_store_skips_untrusted_numbers():
+    for confidence, indexed in (('valid', True), ('corrected', True), ('ambiguous', False), ('invalid', False)):
+        record = {'Document Type': 'Aadhaar', 'Data': {'Aadhar': '2345 6789 0123', 'Aadhar Confidence': confidence}}
+        assert (store.numbers(record)[1] is not None) == indexed
@@ -0,0 +1,61 @@
+import importlib.util
+import os
+
+import cv2
+import numpy as np
+
+from misc import devanagari, engine, metrics
+from misc.box import WORD_DTYPE
+from misc.ocr import OcrResult
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location('dococr_app', os.path.join(ROOT, 'app', 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def test_extract_is_timed(monkeypatch):
+    monkeypatch.setattr(devanagari, 'ocr', lambda gray, lang='eng', config='':
+                        OcrResult('', np.array([], dtype=str), np.zeros(0, WORD_DTYPE)))
+    monkeypatch.setattr(engine.mrz, 'read_mrz', lambda image, lang: None)
+    metrics.REGISTRY.drain()
+    client = load_app().test_client()
+    with open(os.path.join(ROOT, 'pan/pancard-sample.jpg'), 'rb') as f:
+        reply = client.post('/extract', data={'image': (f, 'card.jpg')})
+    assert reply.status_code == 200
+    assert 'Document Type' in reply.get_json()
+    text = client.get('/metrics').get_data(as_text=True)
+    for stage in ('decode', 'extract', 'ocr'):
+        assert 'dococr_stage_seconds_count{stage="%s"} 1' % stage in text
+    assert 'stage="deskew"' not in text
+    assert 'dococr_cpu_workers ' in text
+
+
+def test_deskew_only_when_asked(monkeypatch):
+    modes = []
+    monkeypatch.setattr(engine, 'preprocess', lambda gray, mode='thresh': modes.append(mode) or gray)
+    monkeypatch.setattr(devanagari, 'ocr', lambda gray, lang='eng', config='':
+                        OcrResult('', np.array([], dtype=str), np.zeros(0, WORD_DTYPE)))
+    monkeypatch.setattr(engine.mrz, 'read_mrz', lambda image, lang: None)
+    metrics.REGISTRY.drain()
+    client = load_app().test_client()
+    with open(os.path.join(ROOT, 'pan/pancard-sample.jpg'), 'rb') as f:
+        reply = client.post('/extract', data={'image': (f, 'card.jpg'), 'preprocess': 'deskew,adaptive'})
+    assert reply.status_code == 200
+    assert modes == ['adaptive']
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'dococr_stage_seconds_count{stage="deskew"} 1' in text
+
+
+def test_deskew_levels_text():
+    from misc.deskew import deskew
+    page = np.full((400, 600), 255, np.uint8)
+    for y in range(120, 280, 30):
+        cv2.putText(page, 'PERMANENT ACCOUNT NUMBER', (60, y), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    for turn in (-12, 5):
+        tilted = cv2.warpAffine(page, cv2.getRotationMatrix2D((300, 200), turn, 1.0), (600, 400), borderValue=255)
+        assert abs(deskew(tilted)[1] + turn) < 0.5
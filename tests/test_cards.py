@@ -0,0 +1,40 @@
+import numpy as np
+
+from misc import cards, cpu, daemon, engine
+
+
+def fake_sheet(monkeypatch, n_cards, cores):
+    """Patch out card finding and OCR; returns the list the pool sizes go to."""
+    sizes = []
+
+    class Pool(cards.ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            sizes.append(max_workers)
+            super(Pool, self).__init__(max_workers)
+
+    monkeypatch.setattr(cards, 'ThreadPoolExecutor', Pool)
+    monkeypatch.setattr(cpu, 'available_cores', lambda: cores)
+    monkeypatch.setattr(cards, 'find_cards', lambda image: [(None, (0, 0, 9, 9))] * n_cards)
+    monkeypatch.setattr(engine, 'extract', lambda crop, **kw: engine.Extraction('PAN', {}))
+    monkeypatch.setattr(engine, 'load_image', lambda path: np.zeros((20, 20, 3), np.uint8))
+    return sizes
+
+
+def pool_size(monkeypatch, n_cards, cores, max_workers=None):
+    sizes = fake_sheet(monkeypatch, n_cards, cores)
+    records = cards.extract_cards(np.zeros((20, 20, 3), np.uint8), max_workers=max_workers)
+    assert len(records) == n_cards
+    return sizes[0]
+
+
+def test_threads_follow_the_cpu_layout(monkeypatch):
+    assert pool_size(monkeypatch, 12, cores=4) == 4
+    assert pool_size(monkeypatch, 2, cores=4) == 2
+    assert pool_size(monkeypatch, 12, cores=4, max_workers=3) == 3
+
+
+def test_daemon_cards_stay_in_their_slot(monkeypatch):
+    sizes = fake_sheet(monkeypatch, 6, cores=8)
+    assert len(daemon.handle_request({'image': 'sheet.jpg', 'cards': True})) == 6
+    daemon.handle_request({'image': 'sheet.jpg', 'cards': True}, threads=2)
+    assert sizes == [1, 2]
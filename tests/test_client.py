@@ -0,0 +1,46 @@
+import json
+import socket
+import threading
+
+from misc import client
+
+
+def serve_once(path, reply):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+
+    def answer():
+        conn, _ = server.accept()
+        conn.makefile('rb').readline()
+        conn.sendall(reply)
+        conn.close()
+        server.close()
+
+    thread = threading.Thread(target=answer)
+    thread.start()
+    return thread
+
+
+def run(monkeypatch, capsys, path):
+    monkeypatch.setattr(client, 'run_local', lambda request: {'Local': True})
+    client.main(['-i', 'card.jpg', '--socket', path])
+    return json.loads(capsys.readouterr().out)
+
+
+def test_no_daemon_runs_locally(monkeypatch, capsys, tmp_path):
+    assert run(monkeypatch, capsys, str(tmp_path / 'none.sock')) == {'Local': True}
+
+
+def test_malformed_reply_runs_locally(monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / 'd.sock')
+    thread = serve_once(path, b'{"Document Type": "PA')
+    assert run(monkeypatch, capsys, path) == {'Local': True}
+    thread.join()
+
+
+def test_daemon_reply_is_printed(monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / 'd.sock')
+    thread = serve_once(path, b'{"Document Type": "PAN", "Data": {}}\n')
+    assert run(monkeypatch, capsys, path) == {'Document Type': 'PAN', 'Data': {}}
+    thread.join()
@@ -0,0 +1,21 @@
+from misc import cpu
+
+
+def test_one_single_threaded_worker_per_core():
+    layout = cpu.plan(cores=8)
+    assert (layout.workers, layout.cv_threads, layout.omp_threads) == (8, 1, 1)
+
+
+def test_spare_cores_become_threads():
+    layout = cpu.plan(tasks=2, cores=8)
+    assert (layout.workers, layout.cv_threads, layout.omp_threads) == (2, 4, 4)
+
+
+def test_gil_bound_stages_cap_threaded_workers():
+    # A quarter of each request holds the GIL: four at once keep it busy.
+    mix = {'ocr': 0.6, 'preprocess': 0.15, 'parse': 0.25, 'extract': 1.0}
+    layout = cpu.plan(cores=32, threaded=True, mix=mix)
+    assert (layout.workers, layout.cv_threads, layout.omp_threads) == (4, 8, 4)
+    assert cpu.plan(cores=32, mix=mix).workers == 32
+    assert cpu.plan(jobs=16, cores=32, threaded=True, mix=mix).workers == 16
+    assert cpu.plan(cores=8, threaded=True).workers == 8
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import cv2
+
+from misc import crop_morphology
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_pull_in_ocr():
+    code = 'import sys, misc.crop_morphology; print(sorted({"misc.batch", "misc.engine", "pytesseract"} & set(sys.modules)))'
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    assert out.strip() == b'[]'
+
+
+def test_same_named_images_render_apart(tmp_path):
+    for d in ('a', 'b'):
+        (tmp_path / d).mkdir()
+        cv2.imwrite(str(tmp_path / d / 'card.jpg'), cv2.imread(os.path.join(ROOT, 'pan', 'pancard-sample.jpg')))
+    out = tmp_path / 'debug'
+    out.mkdir()
+    for d in ('a', 'b'):
+        record = crop_morphology.crop_path(str(tmp_path / d / 'card.jpg'), str(out), debug_rate=1.0)
+        assert len(record['Crop']) == 4
+    assert len(os.listdir(str(out))) == 2
@@ -0,0 +1,38 @@
+import os
+
+import cv2
+
+from misc import devanagari
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rects(name):
+    return devanagari.devanagari_rects(cv2.imread(os.path.join(ROOT, name), cv2.IMREAD_GRAYSCALE))
+
+
+def covers(found, y):
+    return any(y1 <= y < y2 for _, y1, _, y2 in found)
+
+
+def test_latin_header_is_not_devanagari():
+    # "GOVERNMENT OF INDIA" is printed over the green band, below "भारत सरकार".
+    found = rects('aadhar/aadhar_sample.jpg')
+    assert not covers(found, 110)
+    assert covers(found, 80)
+
+
+def test_hindi_name_lines_are_found():
+    found = rects('aadhar/aadhar_sample.jpg')
+    # "टॉमी सिंह" and "पिता : शेरू सिंह", in small light print.
+    assert covers(found, 165)
+    assert covers(found, 209)
+
+
+def test_telugu_card_has_no_devanagari():
+    assert rects('aadhar/hhhhh.jpeg') == []
+
+
+def test_headers_and_footers_are_found():
+    assert covers(rects('aadhar/aadhar1.jpg'), 288)
+    assert len(rects('pan/pancard-sample.jpg')) >= 3
@@ -0,0 +1,24 @@
+import sys
+
+import ftfy
+
+from misc import engine
+
+
+def test_fast_path_agrees_with_ftfy():
+    # Every BMP code point the fast path lets through, alone and inside a
+    # word, must come back from ftfy unchanged. Astral ones always go to ftfy.
+    missed = []
+    for cp in range(0x10000):
+        if 0xd800 <= cp < 0xe000:
+            continue
+        for text in (chr(cp), 'A' + chr(cp) + 'b '):
+            if not engine.needs_cleanup(text) and ftfy.fix_encoding(ftfy.fix_text(text)) != text:
+                missed.append(hex(cp))
+                break
+    assert missed == []
+    assert engine.needs_cleanup(chr(sys.maxunicode))
+
+
+def test_ideographic_space_is_cleaned():
+    assert engine.clean_text('PAN　NUMBER') == 'PAN NUMBER'
@@ -0,0 +1,36 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from misc import batch, daemon, engine, orientation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sideways_jpeg(tmp_path):
+    """A card turned on its side, saved with EXIF Orientation=1 as phones do."""
+    image = cv2.rotate(cv2.imread(os.path.join(ROOT, 'pan/pancard-sample.jpg')), cv2.ROTATE_90_CLOCKWISE)
+    path = str(tmp_path / 'sideways.jpg')
+    exif = Image.Exif()
+    exif[0x0112] = 1
+    Image.fromarray(image[:, :, ::-1]).save(path, exif=exif)
+    return path
+
+
+def test_tagged_files_are_still_oriented(tmp_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(engine, 'extract', lambda image, **kw: seen.append(kw['orient']) or engine.Extraction('PAN', {}))
+    path = sideways_jpeg(tmp_path)
+    batch.extract_path(path, orient=True)
+    daemon.handle_request({'image': path, 'orient': True})
+    assert seen == [True, True]
+
+
+def test_sideways_card_is_detected(tmp_path):
+    assert orientation.detect(cv2.imread(sideways_jpeg(tmp_path))) == 270
+
+
+def test_osd_without_tesseract_is_unavailable():
+    assert orientation.osd_angle(np.full((200, 300), 255, np.uint8)) is None
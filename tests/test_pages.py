@@ -0,0 +1,19 @@
+import numpy as np
+from PIL import Image
+
+from misc import pages
+
+
+def test_16_bit_pages_keep_their_range(tmp_path):
+    ramp = np.arange(0, 65536, 256, dtype=np.uint16).reshape(16, 16)
+    path = str(tmp_path / 'scan.tiff')
+    Image.fromarray(ramp).save(path)
+    (index, image), = pages.iter_tiff(path)
+    assert image.dtype == np.uint8
+    assert (image == ramp >> 8).all()
+
+
+def test_float_pages_are_stretched_to_white():
+    page = Image.fromarray(np.linspace(0, 1, 256, dtype=np.float32).reshape(16, 16))
+    image = pages._to_bgr(page)
+    assert image.min() == 0 and image.max() == 255
@@ -0,0 +1,25 @@
+from misc import engine, pan_number
+
+
+def test_name_line_above_pan_is_not_a_pan():
+    # The label is misread, so parse_pan searches the whole card; the name
+    # used to run together into KUMAR7014S and win over the real number.
+    text = 'INCOME TAX DEPARTMENT\nPermanent Acc0unt Numbr\nKUMAR TOLASIBAI\nBNZPM25O1F\n'
+    data = engine.parse_pan(text)
+    assert data['PAN'] == 'BNZPM2501F'
+    assert data['PAN Confidence'] == 'corrected'
+
+
+def test_letters_cannot_fill_digit_positions():
+    assert pan_number.decode('KUMAR TOLASIBAI') == (None, None)
+    assert pan_number.decode('ABCDE FGHIJ') == (None, None)
+
+
+def test_pan_split_at_layout_breaks():
+    assert pan_number.decode('BNZPM 2501 F') == ('BNZPM2501F', 'valid')
+    assert pan_number.decode('BNZPM2501 F') == ('BNZPM2501F', 'valid')
+
+
+def test_fewest_substitutions_wins():
+    assert pan_number.decode('BNZPM25O1F\nBNZPM2501F') == ('BNZPM2501F', 'valid')
+    assert pan_number.decode('8NZPM25O1F\nBNZPM25O1F') == ('BNZPM2501F', 'corrected')
@@ -0,0 +1,86 @@
+import os
+
+import cv2
+import numpy as np
+
+from misc import devanagari, engine, phash
+from misc.box import WORD_DTYPE
+from misc.ocr import OcrResult
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Hashes at least 32 bits apart from each other: never near-duplicates.
+A, B, C = 0, (1 << 64) - 1, (1 << 32) - 1
+
+
+def key(h, name):
+    return h, name.encode('ascii')
+
+
+def test_exact_and_near_hits():
+    cache = phash.HashCache()
+    cache.put(key(A, 'a'), 'a')
+    assert cache.get(key(A, 'a')) == ('a', True)
+    assert cache.get(key(A ^ 0b101, 'a2')) == ('a', False)
+    assert cache.get(key(B, 'b')) == (None, False)
+
+
+def test_least_recently_used_is_evicted():
+    cache = phash.HashCache(max_entries=2)
+    cache.put(key(A, 'a'), 'a')
+    cache.put(key(B, 'b'), 'b')
+    assert cache.get(key(A, 'a'))[0] == 'a'
+    cache.put(key(C, 'c'), 'c')
+    assert len(cache) == 2
+    assert cache.get(key(B, 'b'))[0] is None
+    assert cache.get(key(A, 'a'))[0] == 'a'
+    assert cache.get(key(C, 'c'))[0] == 'c'
+
+
+def test_index_is_rebuilt_past_the_cap():
+    cache = phash.HashCache(max_distance=0, max_entries=4)
+    for i in range(64):
+        cache.put(key(1 << i, str(i)), i)
+    assert len(cache) == 4
+    assert len(cache.tree) <= 8
+    assert [cache.get(key(1 << i, 'x'))[0] for i in range(60, 64)] == [60, 61, 62, 63]
+
+
+def card(name, pan):
+    """A PAN card template with the holder's name and number printed on it."""
+    image = cv2.imread(os.path.join(ROOT, 'pan/pan_card_template.jpg'))
+    cv2.putText(image, name, (30, 250), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    cv2.putText(image, pan, (30, 330), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    return image
+
+
+def test_other_holder_on_the_same_template_is_not_reused(monkeypatch):
+    printed = {}
+
+    def ocr(gray, lang='eng', config=''):
+        # Reads what is printed: the whole card, or just the number's box.
+        words = ['Name', printed['name'], 'Permanent', 'Account', 'Number', printed['pan']]
+        boxes = np.zeros(len(words), WORD_DTYPE)
+        if gray.shape[0] < 100:
+            words, boxes = words[-1:], boxes[-1:]
+        else:
+            boxes[-1] = (1, 1, 1, 1, 1, 30, 305, 200, 30, 90)
+        return OcrResult('\n'.join(words), np.array(words), boxes)
+
+    monkeypatch.setattr(devanagari, 'ocr', ocr)
+    monkeypatch.setattr(engine.mrz, 'read_mrz', lambda image, lang: None)
+    first, second = card('RAHUL KUMAR', 'ABCPK1234F'), card('SITA DEVI', 'BNZPM2501F')
+    assert phash.hamming(phash.phash(first), phash.phash(second)) <= phash.MAX_DISTANCE
+    cache = phash.HashCache()
+
+    printed.update(name='RAHUL KUMAR', pan='ABCPK1234F')
+    assert not engine.extract(first, doc_type='PAN', cache=cache).cached
+    assert engine.extract(first.copy(), doc_type='PAN', cache=cache).cached
+    # A re-encode of the same card reads the same number: reused.
+    reencoded = cv2.imdecode(cv2.imencode('.jpg', first, [cv2.IMWRITE_JPEG_QUALITY, 80])[1], cv2.IMREAD_COLOR)
+    assert engine.extract(reencoded, doc_type='PAN', cache=cache).cached
+
+    printed.update(name='SITA DEVI', pan='BNZPM2501F')
+    record = engine.extract(second, doc_type='PAN', cache=cache)
+    assert not record.cached
+    assert record.data['PAN'] == 'BNZPM2501F'
@@ -0,0 +1,41 @@
+import os
+
+import cv2
+import numpy as np
+
+from misc import quality
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = ['aadhar/aadhar1.jpg', 'aadhar/aadhar_sample.jpg', 'pan/pancard-sample.jpg',
+           'pan/pan_card_template.jpg', 'driving-licence/driving_licence_sample.jpeg']
+
+
+def load(name):
+    return cv2.imread(os.path.join(ROOT, name))
+
+
+def add_glare(image, radius):
+    """A blown-out spot with a soft halo, radius a fraction of the width."""
+    h, w = image.shape[:2]
+    yy, xx = np.mgrid[:h, :w]
+    r = radius * w
+    alpha = np.clip((1.6 * r - np.hypot(xx - 0.6 * w, yy - 0.4 * h)) / (0.6 * r), 0, 1)[..., None]
+    return (image * (1 - alpha) + 255 * alpha).astype(np.uint8)
+
+
+def test_white_cards_are_not_glare():
+    for name in SAMPLES:
+        assert quality.assess(load(name))['glare'] < quality.MAX_GLARE, name
+
+
+def test_glared_card_is_rejected():
+    image = load('pan/pancard-sample.jpg')
+    assert quality.check(image)[0] is None
+    reason, scores = quality.check(add_glare(image, 0.12))
+    assert reason == 'glare'
+    assert scores['glare'] > quality.MAX_GLARE
+
+
+def test_frame_score_prefers_the_unglared_frame():
+    image = load('pan/pancard-sample.jpg')
+    assert quality.frame_scores(image)['score'] > 2 * quality.frame_scores(add_glare(image, 0.08))['score']
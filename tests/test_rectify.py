@@ -0,0 +1,54 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from misc import engine, rectify
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def document(width, height):
+    """A light page of the given size, tilted, on a dark table."""
+    image = np.full((900, 1400, 3), 40, np.uint8)
+    quad = np.array([[200, 150], [200 + width, 180], [180 + width, 180 + height], [190, 150 + height]], np.int32)
+    cv2.fillPoly(image, [quad], (235, 235, 235))
+    return image
+
+
+def test_id1_card_fills_the_card_raster():
+    card = rectify.rectify(document(856, 540))
+    assert card.shape[:2] == rectify.CARD_SIZE[::-1]
+
+
+def test_other_documents_keep_their_proportions():
+    page = rectify.rectify(document(880, 620))
+    h, w = page.shape[:2]
+    assert w == rectify.CARD_SIZE[0]
+    assert abs(w / float(h) - 880 / 620.0) < 0.05
+
+
+def test_uncropped_passport_is_not_resized():
+    assert rectify.rectify(cv2.imread(os.path.join(ROOT, 'Passport/passport.jpeg'))) is None
+
+
+class Stop(Exception):
+    pass
+
+
+def test_warped_card_is_not_upscaled(monkeypatch):
+    modes = []
+
+    def preprocess(gray, mode='thresh'):
+        modes.append((gray.shape, mode))
+        raise Stop
+
+    monkeypatch.setattr(engine, 'preprocess', preprocess)
+    monkeypatch.setattr(engine.mrz, 'read_mrz', lambda image, lang: None)
+    image = cv2.imread(os.path.join(ROOT, 'aadhar/aadhar_sample.jpg'))
+    image = cv2.resize(image, None, fx=0.7, fy=0.7, interpolation=cv2.INTER_AREA)
+    for warp in (False, True):
+        with pytest.raises(Stop):
+            engine.extract(image, gate=True, warp=warp)
+    assert modes == [(image.shape[:2], 'cubic'), (rectify.CARD_SIZE[::-1], 'thresh')]
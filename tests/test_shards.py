@@ -0,0 +1,43 @@
+import os
+import shutil
+
+from misc import batch, engine, shards
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_images(tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    shutil.copy(os.path.join(ROOT, 'pan/pancard-sample.jpg'), str(images / 'a.jpg'))
+    (images / 'b.jpg').write_bytes(b'')
+    shutil.copy(os.path.join(ROOT, 'aadhar/aadhar1.jpg'), str(images / 'c.jpg'))
+    return str(images)
+
+
+def test_pack_streams_members_into_shards(tmp_path):
+    images = make_images(tmp_path)
+    paths = shards.pack(images, str(tmp_path / 'shards'), shard_bytes=1)
+    # The empty b.jpg does not fill a shard, so c.jpg joins it.
+    assert len(paths) == 2
+    with shards.ShardReader(paths[1]) as reader:
+        (_, empty), (name, image) = reader
+    assert empty is None
+    assert name == 'c.jpg' and image.shape[:2] == (311, 448)
+
+
+def test_undecodable_member_gets_an_error_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'extract', lambda image, **kw: engine.Extraction('PAN', {}))
+    path, = shards.pack(make_images(tmp_path), str(tmp_path / 'shards'))
+    records = batch.extract_shard(path)
+    assert [r['File'] for r in records] == ['a.jpg', 'b.jpg', 'c.jpg']
+    assert records[1]['Error'] == 'could not decode image'
+    assert 'Error' not in records[0] and 'Error' not in records[2]
+
+
+def test_failed_shard_releases_its_claim(tmp_path):
+    path, = shards.pack(make_images(tmp_path), str(tmp_path / 'shards'))
+    os.remove(path + '.idx')
+    record, = batch.extract_shard(path)
+    assert record['Shard'] == path and 'Error' in record
+    assert not os.path.exists(path + '.claim')
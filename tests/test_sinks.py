@@ -0,0 +1,31 @@
+import io
+import json
+
+import pytest
+
+from misc import sinks
+
+
+def test_sink_without_write_batch_cannot_be_built():
+    class Incomplete(sinks.Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_records_are_written_in_batches(tmp_path):
+    path = str(tmp_path / 'out.jsonl')
+    with sinks.open_sink(path, batch_size=2) as sink:
+        for i in range(3):
+            sink.write({'File': str(i)})
+            if i == 1:
+                assert len(open(path).readlines()) == 2
+    assert [json.loads(line)['File'] for line in open(path)] == ['0', '1', '2']
+
+
+def test_stdout_sink_prints_each_record():
+    stream = io.StringIO()
+    with sinks.StdoutSink(stream=stream) as sink:
+        sink.write({'File': 'a.jpg'})
+    assert json.loads(stream.getvalue()) == {'File': 'a.jpg'}